@@ -0,0 +1,224 @@
+'''Benchmarks the scan hot paths on synthetic Steam libraries.
+
+    python benchmark.py --manifests 10000 --libraries 2 --json bench.json
+
+Every library gets linked installs (depth x files per level), manifests whose install
+directory is missing (unlinked) and nearly empty install directories (ghosts).
+Results are printed as JSON so runs can be compared over time.'''
+import argparse
+import builtins
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import muncher_core as core
+
+MANIFEST_TEMPLATE = '''"AppState"
+{{
+	"appid"		"{appid}"
+	"Universe"		"1"
+	"name"		"Synthetic {appid}"
+	"StateFlags"		"4"
+	"installdir"		"{installdir}"
+	"SizeOnDisk"		"{size}"
+	"BytesToDownload"		"{size}"
+	"BytesDownloaded"		"{size}"
+	"InstalledDepots"
+	{{
+		"{depot}"
+		{{
+			"manifest"		"{appid}000"
+			"size"		"{size}"
+		}}
+	}}
+}}
+'''
+
+def make_library(library_root, manifests, unlinked_ratio, ghost_ratio, depth, files, file_size, rng, first_appid=10):
+    '''Writes a synthetic library -> steamapps path'''
+    steamapps = os.path.join(library_root, 'steamapps')
+    common = os.path.join(steamapps, 'common')
+    os.makedirs(common, exist_ok=True)
+    payload = b'\0' * file_size
+    for index in range(manifests):
+        appid = first_appid + index
+        installdir = f"Game {appid}"
+        roll = rng.random()
+        game_dir = os.path.join(common, installdir)
+        if roll < unlinked_ratio:
+            pass #no install directory at all
+        elif roll < unlinked_ratio + ghost_ratio:
+            os.makedirs(game_dir)
+            with open(os.path.join(game_dir, 'steam_appid.txt'), 'w') as f:
+                f.write(str(appid))
+        else:
+            directory = game_dir
+            for level in range(max(depth, 1)):
+                os.makedirs(directory)
+                for file_index in range(files):
+                    with open(os.path.join(directory, f"data{file_index}.pak"), 'wb') as f:
+                        f.write(payload)
+                directory = os.path.join(directory, f"level{level}")
+        with open(os.path.join(steamapps, f"appmanifest_{appid}.acf"), 'w') as f:
+            f.write(MANIFEST_TEMPLATE.format(appid=appid, installdir=installdir, depot=appid + 1,
+                                             size=depth * files * file_size))
+    return steamapps
+
+def make_steam_root(root, libraries):
+    '''Steam install whose libraryfolders.vdf lists the libraries -> Steam root'''
+    steam_root = os.path.join(root, 'Steam')
+    os.makedirs(os.path.join(steam_root, 'steamapps'), exist_ok=True)
+    with open(os.path.join(steam_root, 'steamapps', 'libraryfolders.vdf'), 'w') as f:
+        f.write('"libraryfolders"\n{\n')
+        for index, library in enumerate(libraries):
+            f.write(f'\t"{index}"\n\t{{\n\t\t"path"\t\t"{os.path.dirname(library)}"\n\t}}\n')
+        f.write('}\n')
+    return steam_root
+
+class SyscallCounter:
+    '''Counts calls to the os/io entry points the scanner uses while active.
+    DirEntry.stat results come from scandir and are not counted (free on Windows, lstat on POSIX)'''
+    NAMES = ('stat', 'lstat', 'scandir', 'listdir', 'unlink', 'remove', 'rmdir')
+
+    def __enter__(self):
+        self.counts = dict.fromkeys(self.NAMES + ('open',), 0)
+        self._originals = {name: getattr(os, name) for name in self.NAMES}
+        self._open = builtins.open
+        for name, function in self._originals.items():
+            setattr(os, name, self._counting(name, function))
+        builtins.open = self._counting('open', self._open)
+        return self
+
+    def _counting(self, name, function):
+        counts = self.counts
+        def counted(*args, **kwargs):
+            counts[name] += 1
+            return function(*args, **kwargs)
+        return counted
+
+    def __exit__(self, *exc_info):
+        for name, function in self._originals.items():
+            setattr(os, name, function)
+        builtins.open = self._open
+
+def _proc_status(field):
+    '''VmRSS/VmHWM of this process in bytes, from /proc (Linux)'''
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024 #kB
+    raise OSError(f"no {field} in /proc/self/status")
+
+def reset_peak_rss():
+    '''Starts a new peak RSS window -> current RSS in bytes, None where the peak cannot be reset.
+    ru_maxrss only ever rises and generating the libraries dominates it, so it says nothing per stage'''
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5') #resets VmHWM to the current RSS
+        return _proc_status('VmRSS')
+    except OSError: #not Linux
+        return None
+
+def peak_rss():
+    '''Peak RSS in bytes since reset_peak_rss()'''
+    return _proc_status('VmHWM')
+
+def measure(name, items, function):
+    '''Runs function once -> result dict'''
+    baseline_rss = reset_peak_rss()
+    with SyscallCounter() as counter:
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+    peak = peak_rss() if baseline_rss is not None else None
+    return {'stage': name, 'seconds': round(seconds, 6), 'items': items,
+            'items_per_second': round(items / seconds, 1) if seconds else None,
+            'syscalls': sum(counter.counts.values()), 'calls': counter.counts,
+            'peak_rss': peak, 'peak_rss_growth': peak - baseline_rss if peak is not None else None}
+
+def run(args, root):
+    rng = random.Random(args.seed)
+    per_library = args.manifests // args.libraries
+    libraries = [make_library(os.path.join(root, f"Library{index}"), per_library, args.unlinked_ratio,
+                              args.ghost_ratio, args.depth, args.files, args.file_size, rng,
+                              first_appid=10 + index * per_library)
+                 for index in range(args.libraries)]
+    steam_root = make_steam_root(root, libraries)
+    manifest_paths = [path for library in libraries for path in core.Muncher.list_manifests(library)]
+    install_dirs = [os.path.join(library, 'common', name) for library in libraries
+                    for name in os.listdir(os.path.join(library, 'common'))]
+
+    class BenchMuncher(core.Muncher):
+        POSIX_STEAM_ROOTS = [steam_root] #discovery only sees the synthetic Steam install
+        SCAN_CACHE_FILE = os.path.join(root, 'steam_scan.db')
+        def list_disks(self):
+            return []
+    quiet = open(os.devnull, 'w')
+    def muncher(use_cache=False):
+        return BenchMuncher(max_workers=args.workers, use_cache=use_cache, out=quiet)
+
+    results = []
+    for _ in range(args.repeat):
+        results.append(measure('find_libraries', len(libraries), lambda: muncher().find_libraries([])))
+        results.append(measure('load_manifests', len(manifest_paths), lambda: muncher().load_manifests(libraries)))
+        cold = muncher(use_cache=True)
+        results.append(measure('load_manifests_cache_cold', len(manifest_paths), lambda: cold.load_manifests(libraries)))
+        warm = muncher(use_cache=True)
+        results.append(measure('load_manifests_cache_warm', len(manifest_paths), lambda: warm.load_manifests(libraries)))
+        serial = muncher()
+        results.append(measure('is_unlinked', len(manifest_paths), lambda: [serial.is_unlinked(path) for path in manifest_paths]))
+        results.append(measure('is_ghost_directory', len(install_dirs),
+                               lambda: [core.Muncher.is_ghost_directory(path) for path in install_dirs]))
+        os.remove(BenchMuncher.SCAN_CACHE_FILE)
+    #Removal is destructive, so it runs once on a copy of the unlinked manifests
+    scratch = os.path.join(root, 'removal')
+    os.makedirs(scratch)
+    targets = []
+    for path in muncher().load_manifests(libraries):
+        copy = os.path.join(scratch, os.path.basename(path))
+        shutil.copyfile(path, copy)
+        targets.append((copy,))
+    results.append(measure('remove_manifests', len(targets), lambda: muncher().delete(targets)))
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'root': root,
+            'config': {key: value for key, value in vars(args).items() if key not in ('json', 'keep', 'root')},
+            'results': results}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scanner on synthetic Steam libraries.")
+    parser.add_argument('--manifests', type=int, default=10000, help="total manifests across all libraries")
+    parser.add_argument('--libraries', type=int, default=1)
+    parser.add_argument('--unlinked-ratio', type=float, default=0.1, help="manifests without an install directory")
+    parser.add_argument('--ghost-ratio', type=float, default=0.05, help="manifests with a near empty install directory")
+    parser.add_argument('--depth', type=int, default=3, help="directory levels per linked install")
+    parser.add_argument('--files', type=int, default=4, help="files per level of a linked install")
+    parser.add_argument('--file-size', type=int, default=4096, metavar='BYTES')
+    parser.add_argument('--workers', type=int, default=core.Muncher.MAX_WORKERS)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--root', help="where to generate libraries, e.g. /dev/shm for tmpfs (default: temp dir)")
+    parser.add_argument('--keep', action='store_true', help="keep the generated libraries")
+    parser.add_argument('--json', metavar='FILE', help="write results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix='muncher-bench-', dir=args.root)
+    try:
+        report = run(args, root)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+    for result in report['results']:
+        print(f"{result['stage']:<28}{result['seconds']:>10.3f}s{result['items_per_second'] or 0:>12.0f}/s"
+              f"{result['syscalls']:>10} calls{(result['peak_rss_growth'] or 0) / 2**20:>10.1f} MB", file=sys.stderr)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,150 +1,171 @@
-import os, re, subprocess, requests, yaml, sys, ctypes
-from PyQt5.QtWidgets import QApplication, QMainWindow, QListWidget, QPushButton, QComboBox, QVBoxLayout, QWidget, QMessageBox
-from PyQt5.QtCore import Qt
-from datetime import datetime
-
-class Muncher:
-    LIBRARY_PATH_FILE = "steam_libs.yaml"
-    def __init__(self):
-        self.scrap_files = []
-        self.drives = self.get_disks()
-        self.libraries = self.retrieve_libraries(self.drives)
-        self.unlinked_manifests = self.load_manifests(self.libraries)
-        
-    def get_disks(self): 
-        stdout_raw = subprocess.check_output(['fsutil', 'fsinfo', 'drives'])
-        std_utf8 = stdout_raw.decode('utf-8')
-        system_drives = [item.strip() for item in std_utf8.split() if re.match(r'[A-Za-z]{1}:\\', item) is not None]
-        return system_drives
-
-    def find_libraries(self, drives):
-        libraries = []
-        common_paths = [
-        '/Program Files (x86)/Steam/steamapps',
-        '/Program Files/Steam/steamapps',
-        '/SteamLibrary/steamapps',
-        '/Games/Steam/steamapps',
-        ]
-        for drive in drives:
-            for common_path in common_paths:
-                if os.path.exists(os.path.join(drive, common_path)):
-                    libraries.append(os.path.join(drive, common_path)) 
-        print(f"\033[92;1mFound\033[0m \033[1m{len(libraries)}\033[0m \033[92;1mSteam libraries!\033[0m")
-        return libraries
-
-    def retrieve_libraries(self, drives, update=True):
-        if update:
-            return self.find_libraries(drives)
-        elif os.path.exists(self.LIBRARY_PATH_FILE):
-            with open(self.LIBRARY_PATH_FILE, 'r') as f:
-                return yaml.safe_load(f)
-        else:
-            return self.find_libraries(drives)
-        
-    @staticmethod
-    def is_ghost_directory(directory):
-        '''Bool if directory is < 2KB -> True'''
-        #!Some older games may store saves in installation directory.
-        #!Threshold is arbitrary, but unlikely to delete these saves at 2KB
-        size = 0
-        positive_thres = 2 #kb
-        if len(os.listdir(directory)) == 0:
-            return True
-        for dirpath, dirnames, filenames in os.walk(directory):
-            for f in filenames:
-                if size > positive_thres:
-                    return False #early return
-                fp = os.path.join(dirpath, f)
-                # skip if it is symbolic link
-                if not os.path.islink(fp):
-                    size += os.path.getsize(fp)/1024
-        return size < positive_thres  # bool size is less than 2KB
-
-    @staticmethod
-    def get_game_dir(manifest_path):
-        '''manifest path -> installation directory'''
-        common_dir = os.path.join(os.path.dirname(manifest_path), 'common')
-        with open(manifest_path, 'r') as f:
-            lines = f.readlines()
-        for line in lines:
-            line = line.lstrip()
-            if line.startswith("\"installdir\""):
-                line = line.removeprefix("\"installdir\"")
-                game_dir = line.lstrip().lstrip('\"').rstrip().rstrip('\"')
-                break
-        return game_dir
-    
-    def is_unlinked(self, manifest_path):
-        common_dir = os.path.join(os.path.dirname(manifest_path), 'common')
-        with open(manifest_path, 'r') as f:
-            lines = f.readlines()
-        for line in lines:
-            line = line.lstrip()
-            if line.startswith("\"installdir\""):
-                line = line.removeprefix("\"installdir\"")
-                game_dir = line.lstrip().lstrip('\"').rstrip().rstrip('\"')
-                break
-        game_dir = os.path.join(common_dir,game_dir)
-        if os.path.exists(game_dir):
-            if Muncher.is_ghost_directory(game_dir):
-                self.scrap_files.extend([game_dir, manifest_path])
-        return not os.path.exists(game_dir)
-    
-    def load_manifests(self, libraries):
-        manifest_paths = []
-        unlinked_manifest_paths = []
-        for library in libraries:
-            library_manifest_paths = [os.path.join(library, appman) for appman in os.listdir(library) if appman.startswith('appmanifest_') and appman.endswith(".acf")]
-            manifest_paths.extend(library_manifest_paths)
-        print(f"\033[92;1mFound\033[0m \033[1m{len(manifest_paths)}\033[0m \033[92;1m app manifests!\033[0m")
-        for manifest_path in manifest_paths:
-            if self.is_unlinked(manifest_path):
-                unlinked_manifest_paths.append(manifest_path)
-        return unlinked_manifest_paths
-    
-    def remove_manifest_list(self, unlinked_manifests):
+import os, sys
+from PyQt5.QtWidgets import QApplication, QMainWindow, QListView, QPushButton, QComboBox, QVBoxLayout, QHBoxLayout, QWidget, QMessageBox, QLabel, QProgressBar, QAbstractItemView
+from PyQt5.QtCore import Qt, QObject, QThread, QThreadPool, QRunnable, pyqtSignal, pyqtSlot, QAbstractListModel, QModelIndex, QSortFilterProxyModel
+
+from muncher_core import Muncher, REMOVABLE
+
+class ScanWorker(QObject):
+    '''Streams findings from Muncher.iter_library_checks on a QThread'''
+    BATCH_SIZE = 64 #findings per signal, keeps the event queue short on big libraries
+    libraries_found = pyqtSignal(int)
+    findings_found = pyqtSignal(list)
+    library_scanned = pyqtSignal(str)
+    finished = pyqtSignal(bool) #cancelled
+
+    def __init__(self, muncher):
+        super().__init__()
+        self.muncher = muncher
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True #checked after every manifest, clean ones included
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            libraries = self.muncher.find_libraries(self.muncher.drives)
+            self.libraries_found.emit(len(libraries))
+            checks = self.muncher.iter_library_checks(libraries)
+            for library, findings in checks:
+                batch = []
+                for finding in findings:
+                    if self._cancelled:
+                        break
+                    if finding.verdict == 'ok':
+                        continue
+                    batch.append(finding)
+                    if len(batch) >= self.BATCH_SIZE:
+                        self.findings_found.emit(batch)
+                        batch = []
+                if batch:
+                    self.findings_found.emit(batch)
+                if self._cancelled:
+                    checks.close() #stops the other libraries' checks too
+                    break
+                self.library_scanned.emit(library)
+        finally:
+            self.finished.emit(self._cancelled)
+
+class RemoveSignals(QObject):
+    finished = pyqtSignal(list) #removed manifests
+
+class RemoveWorker(QRunnable):
+    '''Deletes findings on the global QThreadPool, only verdicts in REMOVABLE'''
+    def __init__(self, muncher, findings):
+        super().__init__()
+        self.muncher = muncher
+        self.findings = [finding for finding in findings if finding.verdict in REMOVABLE] #stale installs are report only
+        self.signals = RemoveSignals()
+
+    def run(self):
         removed_manifests = []
-        removed_scraps = []
-        
-        if len(unlinked_manifests) > 0:
-            for manifest in unlinked_manifests:
-                if os.path.isfile(manifest):
-                    os.remove(manifest)
-                    removed_manifests.append(manifest)
-        return removed_manifests, removed_scraps
-def enable_ansi_colors():
-    if sys.platform.startswith('win'):
-        kernel32 = ctypes.windll.kernel32
-        kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
-
-def is_admin():
-    try:
-        return ctypes.windll.shell32.IsUserAnAdmin()
-    except:
-        return False
-
-def run_as_admin():
-    if not is_admin():
-        if sys.platform.startswith('win'):
-            try:
-                ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
-                sys.exit(0)
-            except Exception as e:
-                print("Failed to elevate process:", e)
-                sys.exit(1)
+        try:
+            results = self.muncher.delete([Muncher.finding_paths(finding) for finding in self.findings])
+            removed_manifests = [finding.manifest for finding, deleted in zip(self.findings, results)
+                                 if all(result.error is None for result in deleted)]
+        finally:
+            self.signals.finished.emit(removed_manifests)
+
+class ManifestListModel(QAbstractListModel):
+    '''Flat list of findings, appended to while the scan runs.
+    Qt.UserRole is the manifest path, the display text also names leftover folders'''
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._findings = []
+        self._rows = {} #manifest -> row, so lookups never scan the list
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._findings)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        finding = self._findings[index.row()]
+        if role == Qt.UserRole:
+            return finding.manifest
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            if finding.verdict not in REMOVABLE:
+                return f"{finding.manifest}  ({finding.verdict}, report only{f': {finding.game_dir}' if finding.game_dir else ''})"
+            return finding.manifest if finding.game_dir is None else f"{finding.manifest}  (leftover folder: {finding.game_dir})"
+        return None
+
+    def flags(self, index):
+        '''Report-only findings (stale installs) can be seen but not selected for removal'''
+        flags = super().flags(index)
+        if index.isValid() and self._findings[index.row()].verdict not in REMOVABLE:
+            flags &= ~Qt.ItemIsSelectable
+        return flags
+
+    def finding(self, manifest):
+        return self._findings[self._rows[manifest]]
+
+    def append_findings(self, findings):
+        findings = [finding for finding in findings if finding.manifest not in self._rows]
+        if not findings:
+            return
+        first = len(self._findings)
+        self.beginInsertRows(QModelIndex(), first, first + len(findings) - 1)
+        self._findings.extend(findings)
+        self._rows.update((finding.manifest, first + offset) for offset, finding in enumerate(findings))
+        self.endInsertRows()
+
+    def remove_manifests(self, manifests):
+        '''Drops manifests in a single batch, O(rows) however many are removed'''
+        rows = sorted({self._rows.pop(manifest) for manifest in manifests if manifest in self._rows})
+        if not rows:
+            return
+        if rows[-1] - rows[0] + 1 == len(rows): #contiguous, e.g. Remove All or a shift-selected block
+            self.beginRemoveRows(QModelIndex(), rows[0], rows[-1])
+            del self._findings[rows[0]:rows[-1] + 1]
+            self._reindex(rows[0])
+            self.endRemoveRows()
         else:
-            print("Elevation is only supported on Windows.")
-    else:
-        print("Already running as admin.")
-            
-from PyQt5.QtWidgets import QApplication, QMainWindow, QListWidget, QPushButton, QComboBox, QVBoxLayout, QWidget, QMessageBox, QLabel
-from PyQt5.QtCore import Qt
+            self.beginResetModel()
+            removed = set(rows)
+            self._findings = [finding for row, finding in enumerate(self._findings) if row not in removed]
+            self._reindex(rows[0])
+            self.endResetModel()
+
+    def _reindex(self, first_row):
+        for row in range(first_row, len(self._findings)): #only rows after the first removal moved
+            self._rows[self._findings[row].manifest] = row
+
+    def clear(self):
+        self.beginResetModel()
+        self._findings = []
+        self._rows = {}
+        self.endResetModel()
+
+class DriveFilterProxy(QSortFilterProxyModel):
+    '''Shows manifests on one drive, or all of them'''
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.drive = None
+
+    def set_drive(self, drive):
+        #Compare drive letters, library paths mix separators ('C:/Program Files (x86)/...')
+        self.drive = os.path.splitdrive(drive)[0].lower() if drive != "All" else None
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.drive is None:
+            return True
+        manifest = self.sourceModel().index(source_row, 0, source_parent).data(Qt.UserRole)
+        return os.path.splitdrive(manifest)[0].lower() == self.drive
+
+    def manifests(self):
+        '''Removable manifests shown with the current filter'''
+        return [self.index(row, 0).data(Qt.UserRole) for row in range(self.rowCount())
+                if self.index(row, 0).flags() & Qt.ItemIsSelectable]
 
 class SteamMuncherGUI(QMainWindow):
     def __init__(self, muncher):
         super().__init__()
         self.muncher = muncher
+        self.scan_thread = None
+        self.scan_worker = None
         self.initUI()
+        self.start_scan()
 
     def initUI(self):
         self.setGeometry(200, 200, 600, 400)
@@ -160,10 +181,23 @@ class SteamMuncherGUI(QMainWindow):
         self.disk_select_combo.addItems(self.muncher.drives)
         self.disk_select_combo.currentTextChanged.connect(self.update_manifest_list)
 
-        self.manifest_list_label = QLabel("Unlinked Manifests", self)  # New label to describe the widget
+        self.manifest_list_label = QLabel("Unlinked Manifests & Leftover Folders", self)  # New label to describe the widget
+
+        self.manifest_model = ManifestListModel(self)
+        self.manifest_proxy = DriveFilterProxy(self)
+        self.manifest_proxy.setSourceModel(self.manifest_model)
+        self.manifest_list_view = QListView(self)
+        self.manifest_list_view.setModel(self.manifest_proxy)
+        self.manifest_list_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.manifest_list_view.setUniformItemSizes(True) #skips per-row size hints on long lists
 
-        self.manifest_list_widget = QListWidget(self)
-        self.update_manifest_list()
+        self.scan_progress = QProgressBar(self)
+        self.scan_status_label = QLabel("Looking for Steam libraries...", self)
+        self.cancel_scan_button = QPushButton('Cancel', self)
+        self.cancel_scan_button.clicked.connect(self.cancel_scan)
+        scan_layout = QHBoxLayout()
+        scan_layout.addWidget(self.scan_progress)
+        scan_layout.addWidget(self.cancel_scan_button)
 
         self.remove_button = QPushButton('Remove', self)
         self.remove_button.clicked.connect(self.remove_selected_manifests)
@@ -173,56 +207,104 @@ class SteamMuncherGUI(QMainWindow):
 
         layout.addWidget(self.disk_select_combo)
         layout.addWidget(self.manifest_list_label)  # Adding label to layout
-        layout.addWidget(self.manifest_list_widget)
+        layout.addWidget(self.manifest_list_view)
+        layout.addWidget(self.scan_status_label)
+        layout.addLayout(scan_layout)
         layout.addWidget(self.remove_button)
         layout.addWidget(self.remove_all_button)  # Adding button to layout
 
         main_widget.setLayout(layout)
 
+    def start_scan(self):
+        self.manifest_model.clear()
+        self.scan_thread = QThread(self)
+        self.scan_worker = ScanWorker(self.muncher)
+        self.scan_worker.moveToThread(self.scan_thread)
+        self.scan_thread.started.connect(self.scan_worker.run)
+        self.scan_worker.libraries_found.connect(self.on_libraries_found)
+        self.scan_worker.findings_found.connect(self.manifest_model.append_findings)
+        self.scan_worker.library_scanned.connect(self.on_library_scanned)
+        self.scan_worker.finished.connect(self.on_scan_finished)
+        self.scan_worker.finished.connect(self.scan_thread.quit)
+        self.scan_thread.finished.connect(self.scan_worker.deleteLater)
+        self.scan_progress.setRange(0, 0) #busy until the library count is known
+        self.cancel_scan_button.setEnabled(True)
+        self.scan_thread.start()
+
+    def cancel_scan(self):
+        if self.scan_worker is not None:
+            self.scan_worker.cancel()
+            self.cancel_scan_button.setEnabled(False)
+            self.scan_status_label.setText("Cancelling...")
+
+    def on_libraries_found(self, count):
+        self.scan_progress.setRange(0, max(count, 1))
+        self.scan_progress.setValue(0)
+        self.scan_status_label.setText(f"Scanning {count} Steam libraries...")
+
+    def on_library_scanned(self, library):
+        self.scan_progress.setValue(self.scan_progress.value() + 1)
+        self.scan_status_label.setText(f"Scanned {library}")
+
+    def on_scan_finished(self, cancelled):
+        self.scan_worker = None
+        self.cancel_scan_button.setEnabled(False)
+        found = self.manifest_model.rowCount()
+        self.scan_status_label.setText(f"{'Scan cancelled' if cancelled else 'Scan complete'}: {found} findings")
+
+    def closeEvent(self, event):
+        if self.scan_thread is not None and self.scan_thread.isRunning():
+            self.cancel_scan()
+            self.scan_thread.quit()
+            self.scan_thread.wait()
+        super().closeEvent(event)
+
     def update_manifest_list(self):
-        self.manifest_list_widget.clear()
-        disk = self.disk_select_combo.currentText()
-        if disk == "All":
-            self.manifest_list_widget.addItems(self.muncher.unlinked_manifests)
-        else:
-            self.manifest_list_widget.addItems([manifest for manifest in self.muncher.unlinked_manifests if manifest.startswith(disk)])
+        self.manifest_proxy.set_drive(self.disk_select_combo.currentText())
 
     def remove_selected_manifests(self):
-        selected_manifests = [item.text() for item in self.manifest_list_widget.selectedItems()]
+        selected_manifests = [index.data(Qt.UserRole) for index in self.manifest_list_view.selectionModel().selectedIndexes()]
         if selected_manifests:
             confirmation_box = QMessageBox.question(self, 'Confirmation',
                                                     'Are you sure you want to delete the selected manifests?',
                                                     QMessageBox.Yes | QMessageBox.No)
             if confirmation_box == QMessageBox.Yes:
-                removed_manifests, _ = self.muncher.remove_manifest_list(selected_manifests)
-                for manifest in removed_manifests:
-                    item = self.manifest_list_widget.findItems(manifest, Qt.MatchExactly)
-                    if item:
-                        self.manifest_list_widget.takeItem(self.manifest_list_widget.row(item[0]))
+                self.start_removal(selected_manifests)
 
     def remove_all_manifests(self):  # New function to remove all manifests
-        all_manifests = [self.manifest_list_widget.item(i).text() for i in range(self.manifest_list_widget.count())]
+        all_manifests = self.manifest_proxy.manifests()
         if all_manifests:
             confirmation_box = QMessageBox.question(self, 'Confirmation',
                                                     'Are you sure you want to delete all manifests?',
                                                     QMessageBox.Yes | QMessageBox.No)
             if confirmation_box == QMessageBox.Yes:
-                removed_manifests, _ = self.muncher.remove_manifest_list(all_manifests)
-                for manifest in removed_manifests:
-                    item = self.manifest_list_widget.findItems(manifest, Qt.MatchExactly)
-                    if item:
-                        self.manifest_list_widget.takeItem(self.manifest_list_widget.row(item[0]))
+                self.start_removal(all_manifests)
+
+    def start_removal(self, manifests):
+        '''Deletes off the UI thread, the view is updated once when it is done'''
+        worker = RemoveWorker(self.muncher, [self.manifest_model.finding(manifest) for manifest in manifests])
+        if not worker.findings:
+            return
+        self.remove_button.setEnabled(False)
+        self.remove_all_button.setEnabled(False)
+        self.scan_status_label.setText(f"Removing {len(worker.findings)} manifests...")
+        worker.signals.finished.connect(self.on_removal_finished)
+        QThreadPool.globalInstance().start(worker)
+
+    def on_removal_finished(self, removed_manifests):
+        self.manifest_model.remove_manifests(removed_manifests)
+        self.remove_button.setEnabled(True)
+        self.remove_all_button.setEnabled(True)
+        self.scan_status_label.setText(f"Removed {len(removed_manifests)} manifests")
 
 def main():
     # run_as_admin()
     # enable_ansi_colors()
-    muncher = Muncher()
-    
     app = QApplication(sys.argv)
+    muncher = Muncher() #cheap, the scan starts once the window is up
     gui = SteamMuncherGUI(muncher)
     gui.show()
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
     main()
-
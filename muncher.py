@@ -1,72 +1,19 @@
-import hashlib
+import argparse
 import json
 import os
-import re
-import subprocess
-import requests
-from datetime import datetime
-import yaml
 import sys
-import ctypes
 
-class SteamAppIDManager:
-    #! Not used in production. Appmanifests provide relative install path
-    #! May prove useful elsewhere
-    url = "https://raw.githubusercontent.com/dgibbs64/SteamCMD-AppID-List/main/steamcmd_appid.json"
-    cache_file = "steam_appid.json"
-    def __init__(self):
-        self.url = SteamAppIDManager.url #No reason for this not to be purely static, but here we are now  
-        self.cache_file = os.path.join(os.getcwd(), SteamAppIDManager.cache_file)
-        self.data = {}
-        self._update_cache()
-
-    def _update_cache(self):
-        if os.path.exists(self.cache_file):
-            with open(self.cache_file, 'r') as f:
-                raw_data = json.load(f)
-                self.data = {str(app["appid"]): app["name"] for app in raw_data["applist"]["apps"]}
-
-            headers = requests.head(self.url).headers
-            if 'Last-Modified' in headers:
-                last_modified = headers['Last-Modified']
-                last_modified_server = datetime.strptime(last_modified, '%a, %d %b %Y %H:%M:%S GMT')
-                last_modified_cache = datetime.fromtimestamp(os.path.getmtime(self.cache_file))
-                if last_modified_server > last_modified_cache:
-                    self._download_file()
-        else:
-            self._download_file()
-
-    def _download_file(self):
-        response = requests.get(self.url)
-        data = response.json()
-        self.data = {str(app["appid"]): app["name"] for app in data["applist"]["apps"]}
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.data, f)
-
-    def get_app_name(self, app_id):
-        # print(self.data)
-        return self.data.get(str(app_id)) #str(app_id) & int(app_id) return None
-
-    def get_app_id(self, app_name):
-        for app_id, name in self.data.items():
-            if name == app_name:
-                return int(app_id)
-        return None
-    
-class Muncher:
-    LIBRARY_PATH_FILE = "steam_libs.yaml"
-    def __init__(self):
-        self.scrap_files = []
-        self.drives = self.get_disks()
-        self.libraries = self.retrieve_libraries(self.drives)
-        self.unlinked_manifests = self.load_manifests(self.libraries)
-        
+import muncher_core as core
+from muncher_core.elevation import enable_ansi_colors, run_as_admin
+from muncher_core.watch import LibraryWatcher
 
+class Muncher(core.Muncher):
+    '''Interactive wizard on top of the shared scan engine'''
     def get_disks(self): 
-        '''['C:\\', 'D:\\']'''
-        stdout_raw = subprocess.check_output(['fsutil', 'fsinfo', 'drives'])
-        std_utf8 = stdout_raw.decode('utf-8')
-        system_drives = [item.strip() for item in std_utf8.split() if re.match(r'[A-Za-z]{1}:\\', item) is not None]
+        '''Prompts for one of list_disks() or all of them'''
+        system_drives = self.list_disks()
+        if not system_drives:
+            return []
         choice = input(f"Select a drive:\n" + 
                        '\n'.join([f'{index}: {item}' for index, item in enumerate(system_drives)]) 
                        + "\nDefault: All mounted drives (Enter)\n")
@@ -74,108 +21,35 @@ class Muncher:
             return system_drives
         elif choice.isdigit():
             return [system_drives[int(choice)]]
-          
-    def find_libraries(self, drives):
-        libraries = []
-        common_paths = [
-        '/Program Files (x86)/Steam/steamapps',
-        '/Program Files/Steam/steamapps',
-        '/SteamLibrary/steamapps',
-        '/Games/Steam/steamapps',
-        ]
-        for drive in drives:
-            for common_path in common_paths:
-                if os.path.exists(os.path.join(drive, common_path)):
-                    libraries.append(os.path.join(drive, common_path)) 
-        print(f"\033[92;1mFound\033[0m \033[1m{len(libraries)}\033[0m \033[92;1mSteam libraries!\033[0m")
-        return libraries
 
-    def retrieve_libraries(self, drives, update=True):
-        if update:
-            return self.find_libraries(drives)
-        elif os.path.exists(self.LIBRARY_PATH_FILE):
-            with open(self.LIBRARY_PATH_FILE, 'r') as f:
-                return yaml.safe_load(f)
-        else:
-            return self.find_libraries(drives)
-        
-    @staticmethod
-    def is_ghost_directory(directory):
-        '''Bool if directory is < 2KB -> True'''
-        #!Some older games may store saves in installation directory.
-        #!Threshold is arbitrary, but unlikely to delete these saves at 2KB
-        size = 0
-        positive_thres = 2 #kb
-        if len(os.listdir(directory)) == 0:
-            return True
-        for dirpath, dirnames, filenames in os.walk(directory):
-            for f in filenames:
-                if size > positive_thres:
-                    return False #early return
-                fp = os.path.join(dirpath, f)
-                # skip if it is symbolic link
-                if not os.path.islink(fp):
-                    size += os.path.getsize(fp)/1024
-        return size < positive_thres  # bool size is less than 2KB
+    def report_deleted(self, results):
+        '''Prints failures -> (paths removed, bytes freed)'''
+        removed = 0
+        freed = 0
+        for target_results in results:
+            for result in target_results:
+                if result.error is None:
+                    removed += 1
+                    freed += result.bytes_freed
+                else:
+                    print(f"\033[91mCould not remove {result.path}: {result.error}\033[0m")
+        return removed, freed
 
-    @staticmethod
-    def get_game_dir(manifest_path):
-        '''manifest path -> installation directory'''
-        common_dir = os.path.join(os.path.dirname(manifest_path), 'common')
-        with open(manifest_path, 'r') as f:
-            lines = f.readlines()
-        for line in lines:
-            line = line.lstrip()
-            if line.startswith("\"installdir\""):
-                line = line.removeprefix("\"installdir\"")
-                game_dir = line.lstrip().lstrip('\"').rstrip().rstrip('\"')
-                break
-        return game_dir
-    
-    
-    def is_unlinked(self, manifest_path):
-        common_dir = os.path.join(os.path.dirname(manifest_path), 'common')
-        with open(manifest_path, 'r') as f:
-            lines = f.readlines()
-        for line in lines:
-            line = line.lstrip()
-            if line.startswith("\"installdir\""):
-                line = line.removeprefix("\"installdir\"")
-                game_dir = line.lstrip().lstrip('\"').rstrip().rstrip('\"')
-                break
-        game_dir = os.path.join(common_dir,game_dir)
-        if os.path.exists(game_dir):
-            if Muncher.is_ghost_directory(game_dir):
-                self.scrap_files.extend([game_dir, manifest_path])
-        return not os.path.exists(game_dir)
-    
-    def load_manifests(self, libraries):
-        manifest_paths = []
-        unlinked_manifest_paths = []
-        for library in libraries:
-            library_manifest_paths = [os.path.join(library, appman) for appman in os.listdir(library) if appman.startswith('appmanifest_') and appman.endswith(".acf")]
-            manifest_paths.extend(library_manifest_paths)
-        print(f"\033[92;1mFound\033[0m \033[1m{len(manifest_paths)}\033[0m \033[92;1m app manifests!\033[0m")
-        for manifest_path in manifest_paths:
-            if self.is_unlinked(manifest_path):
-                unlinked_manifest_paths.append(manifest_path)
-        return unlinked_manifest_paths
-    
     def remove_manifest_list(self, unlinked_manifests):
         if len(unlinked_manifests) > 0:
             print(f"\033[91m{len(unlinked_manifests)} unlinked manifest files were found. Would you like to review them?\033[0m")
             choice = input("\033[1m(Y/n)\033[0m").strip().lower()
             if choice.startswith('y') or choice == "":  
                 for manifest in unlinked_manifests:
-                    print(f"{manifest} : ({Muncher.get_game_dir(manifest)})")        
+                    finding = self.findings.get(manifest)
+                    print(f"{manifest} : ({finding.installdir if finding else self.get_game_dir(manifest)})")        
             else:
                 print("No.")       
             print(f"\033[91mDelete {len(unlinked_manifests)} unlinked manifests?\033[0m")
             choice = input("\033[1m(N/y)\033[0m").strip().lower()
             if choice.startswith('y'):  
-                for manifest in unlinked_manifests:
-                    if os.path.isfile(manifest):
-                        os.remove(manifest)
+                removed, _ = self.report_deleted(self.delete([(manifest,) for manifest in unlinked_manifests]))
+                print(f"\033[91mRemoved {removed} manifests!\033[0m")
             else:  
                 print("No changes were made.")
         
@@ -192,53 +66,172 @@ class Muncher:
                         print(self.scrap_files[idx]) #scrap files should be in pairs, but print everything to be safe
             choice = input("\033[91mRemove these entries?\033[0m \033[1m(N/y)\033[0m").strip().lower()
             if choice.startswith('y'):  
-                count = len(self.scrap_files)
-                for scrap_path in self.scrap_files:
-                    if os.path.exists(scrap_path):
-                        try:
-                            os.popen(f'del /F /Q "{scrap_path}"')
-                        except Exception as e:
-                            print("An error occurred:", str(e))
-                print(f"\033[91mRemoved {count} scraps!\033[0m")
+                pairs = [tuple(self.scrap_files[idx:idx + 2]) for idx in range(0, len(self.scrap_files), 2)]
+                removed, freed = self.report_deleted(self.delete(pairs))
+                print(f"\033[91mRemoved {removed} scraps! ({freed} bytes)\033[0m")
             else:  
                 print("\033[91mNo changes were made.\033[0m")
         else:
             print("\033[92;1mAll Steam Libraries appear clean!\033[0m")
-def enable_ansi_colors():
-    if sys.platform.startswith('win'):
-        kernel32 = ctypes.windll.kernel32
-        kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
 
-def is_admin():
-    try:
-        return ctypes.windll.shell32.IsUserAnAdmin()
-    except:
-        return False
+EXIT_CLEAN = 0
+EXIT_FOUND = 1
+EXIT_FAILED = 3 #2 is taken by argparse usage errors
 
-def run_as_admin():
-    if not is_admin():
-        if sys.platform.startswith('win'):
-            try:
-                ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
-                sys.exit(0)
-            except Exception as e:
-                print("Failed to elevate process:", e)
-                sys.exit(1)
-        else:
-            print("Elevation is only supported on Windows.")
+def build_parser():
+    parser = argparse.ArgumentParser(description="Find stray Steam appmanifests and leftover install directories.",
+                                     epilog="Exit status with --batch: 0 clean, 1 findings, 3 a removal failed.")
+    parser.add_argument('--batch', action='store_true', help="no prompts, print one JSON record per finding")
+    parser.add_argument('--library', action='append', metavar='PATH',
+                        help="Steam library or steamapps directory, repeatable (default: discover)")
+    parser.add_argument('--apply', action='store_true', help="remove findings in batch mode (default: dry run)")
+    parser.add_argument('--threshold', type=int, default=core.Muncher.GHOST_THRESHOLD, metavar='BYTES',
+                        help=f"install directories below this are leftovers (default: {core.Muncher.GHOST_THRESHOLD})")
+    parser.add_argument('--workers', type=int, default=core.Muncher.MAX_WORKERS, metavar='N',
+                        help=f"concurrent manifest checks per library (default: {core.Muncher.MAX_WORKERS})")
+    parser.add_argument('--no-cache', action='store_true', help=f"ignore {core.Muncher.SCAN_CACHE_FILE}")
+    parser.add_argument('--watch', action='store_true',
+                        help="batch mode: keep running and re-check libraries as they change (Ctrl+C to stop)")
+    parser.add_argument('--poll', type=float, metavar='SECONDS',
+                        help="--watch: poll every SECONDS instead of using inotify")
+    parser.add_argument('--names', action='store_true',
+                        help=f"add game names from {core.SteamAppIDManager.cache_file} to batch records (downloaded once)")
+    parser.add_argument('--orphans', action='store_true',
+                        help="batch mode: also report folders in common/, downloading/ and shadercache/ that no manifest "
+                             "references (never removed by --apply)")
+    parser.add_argument('--quarantine', action='store_true',
+                        help="batch mode: move findings into <library>/.muncher_quarantine/<batch> instead of deleting "
+                             "them (implies --apply)")
+    commands = parser.add_mutually_exclusive_group()
+    commands.add_argument('--list-batches', action='store_true', help="list quarantined batches and their paths")
+    commands.add_argument('--restore', metavar='BATCH', help="move a quarantined batch back into place")
+    commands.add_argument('--purge', metavar='BATCH', help="delete a quarantined batch for good")
+    parser.add_argument('--profile', action='store_true',
+                        help="print per-stage timings, I/O counts and the slowest manifests and directories to stderr")
+    parser.add_argument('--trace', metavar='FILE', help="append one JSON line per timed stage to FILE")
+    return parser
+
+def run_batch(muncher, apply=False, apps=None, findings=None, orphans=False, batch=None, streaming=False):
+    '''Prints one JSON record per finding as the scan yields it -> exit status
+    batch: quarantine id, findings are moved into their library's quarantine instead of deleted
+    streaming: findings never end (watch mode), so each one is removed and printed as soon as it arrives'''
+    status = EXIT_CLEAN
+    if findings is None:
+        findings = muncher.scan(orphans=orphans)
+    if apply or batch: #removals overlap with the scan, records keep scan order
+        def remove(finding):
+            if finding.verdict not in core.REMOVABLE:
+                return finding, None
+            paths = core.Muncher.finding_paths(finding)
+            if batch:
+                return finding, core.open_quarantine(os.path.dirname(finding.manifest)).quarantine(batch, paths)
+            return finding, core.delete_paths(paths)
+        results = muncher.ordered_map(remove, findings, 1 if streaming else None)
     else:
-        print("Already running as admin.")
-            
-    
-if __name__ == "__main__":
+        results = ((finding, None) for finding in findings)
+    for finding, deleted in results:
+        record = {'manifest': finding.manifest, 'appid': finding.appid, 'installdir': finding.installdir,
+                  'verdict': finding.verdict, 'bytes': finding.bytes}
+        if finding.game_dir:
+            record['game_dir'] = finding.game_dir
+        if apps is not None:
+            record['name'] = apps.get_app_name(finding.appid)
+        status = max(status, EXIT_FOUND)
+        if deleted is not None:
+            errors = [result.error for result in deleted if result.error is not None]
+            record['removed'] = not errors
+            if batch:
+                record['batch'] = batch
+            else:
+                record['bytes_freed'] = sum(result.bytes_freed for result in deleted)
+            if errors:
+                record['error'] = errors[0]
+                status = EXIT_FAILED
+        print(json.dumps(record), flush=True)
+    return status
+
+def run_quarantine(muncher, args):
+    '''--list-batches, --restore or --purge over every library -> exit status'''
+    status = EXIT_CLEAN
+    for library in muncher.find_libraries(muncher.drives):
+        quarantine = core.open_quarantine(library)
+        if args.list_batches:
+            for batch, items in sorted(quarantine.batches().items()):
+                print(json.dumps({'library': library, 'batch': batch, 'paths': sorted(items)}), flush=True)
+            continue
+        if args.restore:
+            results = [(result.destination, result.error, {}) for result in quarantine.restore(args.restore)]
+        else:
+            results = [(result.path, result.error, {'bytes_freed': result.bytes_freed})
+                       for result in quarantine.purge(args.purge)]
+        if not results:
+            muncher.report(f"Nothing of batch {args.restore or args.purge} is quarantined in {library}")
+        for path, error, extra in results:
+            record = {'library': library, 'batch': args.restore or args.purge, 'path': path,
+                      'restored' if args.restore else 'purged': error is None, **extra}
+            if error is not None:
+                record['error'] = error
+                status = EXIT_FAILED
+            print(json.dumps(record), flush=True)
+    return status
+
+def make_stats(args):
+    '''--profile / --trace -> ScanStats, None when neither was given'''
+    return core.ScanStats(args.trace) if args.profile or args.trace else None
+
+def print_profile(stats, args):
+    if stats is not None:
+        if args.profile:
+            print(stats.format(), file=sys.stderr)
+        stats.close()
+
+def run_wizard(args):
     choice = input("This process needs elevated priveleges to handle read-only file management.\n This may safely be dismissed while retaining partial functionality. Run as admin? Y/n").strip().lower()
     if choice != '':
         if choice in 'yes':
             run_as_admin()
     enable_ansi_colors()
-    muncher = Muncher()
-    muncher.remove_manifest_list(muncher.unlinked_manifests)
+    stats = make_stats(args)
+    muncher = Muncher(max_workers=args.workers, use_cache=not args.no_cache, ghost_threshold=args.threshold,
+                      library_roots=args.library, stats=stats)
+    muncher.remove_manifest_list(muncher.load())
+    print_profile(stats, args)
     input() #Blocking exit
-    
-    # steam_app_id_manager = SteamAppIDManager()
 
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.orphans and args.watch:
+        parser.error("--orphans cannot be combined with --watch")
+    if args.poll is not None and not args.watch:
+        parser.error("--poll needs --watch")
+    if not args.batch:
+        for option in ('apply', 'watch', 'orphans', 'quarantine', 'names'):
+            if getattr(args, option):
+                parser.error(f"--{option} needs --batch, the interactive wizard would ignore it")
+    quarantine_command = args.list_batches or args.restore or args.purge
+    if not (args.batch or quarantine_command):
+        return run_wizard(args)
+    stats = make_stats(args)
+    muncher = core.Muncher(max_workers=args.workers, use_cache=not args.no_cache, ghost_threshold=args.threshold,
+                           library_roots=args.library, out=sys.stderr, stats=stats) #stdout is for records
+    apps = core.SteamAppIDManager() if args.names else None
+    batch = core.new_batch_id() if args.quarantine else None
+    try:
+        if quarantine_command:
+            return run_quarantine(muncher, args)
+        if batch:
+            muncher.report(f"Quarantine batch {batch}")
+        if not args.watch:
+            return run_batch(muncher, args.apply, apps, orphans=args.orphans, batch=batch)
+        watcher = LibraryWatcher(muncher, muncher.find_libraries(muncher.drives), polling=args.poll is not None,
+                                 poll_interval=args.poll or LibraryWatcher.POLL_INTERVAL)
+        try:
+            return run_batch(muncher, args.apply, apps, watcher.watch(), batch=batch, streaming=True)
+        except KeyboardInterrupt:
+            return EXIT_CLEAN
+    finally:
+        print_profile(stats, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
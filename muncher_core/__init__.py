@@ -0,0 +1,13 @@
+'''Scan engine shared by muncher.py (CLI) and manifestGUI.py.
+Heavy optional dependencies (yaml, requests, ctypes) are only imported where they are used.'''
+from .acf import ManifestInfo, MANIFEST_KEYS, iter_vdf_tokens, parse_manifest, load_vdf, libraries_from_vdf
+from .appids import SteamAppIDManager
+from .cache import ScanCache
+from .classify import install_state
+from .deleter import DeleteResult, delete_paths
+from .orphans import ManifestIndex
+from .quarantine import MoveResult, Quarantine, new_batch_id, open_quarantine
+from .scanner import Finding, VERDICTS, REMOVABLE, Muncher, steamapps_dir, registry_steam_path
+from .sizing import directory_size
+from .stats import ScanStats
+from .watch import LibraryWatcher
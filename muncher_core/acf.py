@@ -0,0 +1,97 @@
+'''Streaming VDF/ACF parsing: appmanifest_*.acf and libraryfolders.vdf'''
+import os
+import re
+from collections import namedtuple
+
+ManifestInfo = namedtuple('ManifestInfo', ['path', 'appid', 'installdir', 'state_flags', 'size_on_disk',
+                                           'bytes_to_download', 'bytes_downloaded'])
+MANIFEST_KEYS = ('appid', 'installdir', 'stateflags', 'sizeondisk', 'bytestodownload', 'bytesdownloaded') #lowercase, VDF keys are case insensitive
+_VDF_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|([{}])|(//)|([^\s{}"]+)')
+_VDF_ESCAPES = {'n': '\n', 't': '\t'}
+
+def iter_vdf_tokens(f):
+    '''Streams ('str', value) / ('{', '{') / ('}', '}') tokens from an open VDF/ACF file'''
+    for line in f:
+        for match in _VDF_TOKEN.finditer(line):
+            quoted, brace, comment, bare = match.groups()
+            if comment:
+                break #rest of the line is a comment
+            if brace:
+                yield brace, brace
+            elif quoted is not None:
+                yield 'str', re.sub(r'\\(.)', lambda m: _VDF_ESCAPES.get(m.group(1), m.group(1)), quoted)
+            else:
+                yield 'str', bare
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_manifest(manifest_path, keys=MANIFEST_KEYS, stats=None):
+    '''manifest path -> ManifestInfo, missing keys are None
+    Only top level AppState keys are read and the file is closed as soon as all keys are found.
+    stats: optional ScanStats, counts the open and the bytes actually read from disk'''
+    wanted = set(keys)
+    found = {}
+    depth = 0
+    key = None
+    with open(manifest_path, 'r', encoding='utf-8', errors='replace') as f:
+        for kind, value in iter_vdf_tokens(f):
+            if kind == '{':
+                depth += 1
+                key = None
+            elif kind == '}':
+                depth -= 1
+                key = None
+            elif key is None:
+                key = value
+            else:
+                if depth == 1 and key.lower() in wanted:
+                    found[key.lower()] = value
+                    if len(found) == len(wanted):
+                        break #early exit, skips InstalledDepots etc.
+                key = None
+        if stats:
+            stats.count('open')
+            stats.count('bytes_read', f.buffer.raw.tell())
+    return ManifestInfo(manifest_path, _to_int(found.get('appid')), found.get('installdir') or None,
+                        _to_int(found.get('stateflags')), _to_int(found.get('sizeondisk')),
+                        _to_int(found.get('bytestodownload')), _to_int(found.get('bytesdownloaded')))
+
+def load_vdf(vdf_path):
+    '''VDF file -> nested dict of strings'''
+    root = {}
+    stack = [root]
+    key = None
+    with open(vdf_path, 'r', encoding='utf-8', errors='replace') as f:
+        for kind, value in iter_vdf_tokens(f):
+            if kind == '{':
+                child = {}
+                stack[-1][key or ''] = child
+                stack.append(child)
+                key = None
+            elif kind == '}':
+                if len(stack) > 1:
+                    stack.pop()
+                key = None
+            elif key is None:
+                key = value
+            else:
+                stack[-1][key] = value
+                key = None
+    return root
+
+def libraries_from_vdf(vdf_path):
+    '''libraryfolders.vdf -> [steamapps paths] for every library Steam knows about'''
+    data = load_vdf(vdf_path)
+    folders = next((value for key, value in data.items() if key.lower() == 'libraryfolders'), {})
+    libraries = []
+    for key, value in folders.items():
+        if not key.isdigit():
+            continue #contentstatsid etc.
+        path = value.get('path') if isinstance(value, dict) else value #old format: "1" "D:\\SteamLibrary"
+        if path:
+            libraries.append(os.path.join(path, 'steamapps'))
+    return libraries
@@ -0,0 +1,90 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+class SteamAppIDManager:
+    '''App id <-> name catalogue from the SteamCMD app list, kept in an indexed SQLite file.
+    Lookups are single indexed queries, nothing is loaded up front and no network is needed
+    once the catalogue exists. Appmanifests provide the install path, this is only for display'''
+    url = "https://raw.githubusercontent.com/dgibbs64/SteamCMD-AppID-List/main/steamcmd_appid.json"
+    cache_file = "steam_appid.db"
+    legacy_cache_file = "steam_appid.json" #imported once if present
+    def __init__(self, cache_file=None, refresh=False, background=False):
+        '''refresh: check the server for a newer list. An empty catalogue is always fetched.
+        background: fetch on a daemon thread, lookups answer from the current catalogue meanwhile'''
+        self.cache_file = cache_file or os.path.join(os.getcwd(), SteamAppIDManager.cache_file)
+        self._local = threading.local() #sqlite connections are per thread
+        self.refresh_thread = None
+        with self._connection() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS apps (appid INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+            con.execute("CREATE INDEX IF NOT EXISTS apps_name ON apps (name)")
+            con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if self._is_empty():
+            self._import_legacy_cache()
+        if refresh or self._is_empty():
+            self.refresh(background)
+
+    def _connection(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(self.cache_file)
+        return con
+
+    def _is_empty(self):
+        return self._connection().execute("SELECT 1 FROM apps LIMIT 1").fetchone() is None
+
+    def _store(self, apps, last_modified=None):
+        '''Replaces the catalogue in one transaction, readers keep seeing the old one until commit'''
+        with self._connection() as con:
+            con.execute("DELETE FROM apps")
+            con.executemany("INSERT OR REPLACE INTO apps VALUES (?, ?)", apps)
+            con.execute("INSERT OR REPLACE INTO meta VALUES ('last_modified', ?)", (last_modified,))
+
+    def _import_legacy_cache(self):
+        #Older versions wrote {"appid": "name"} but read {"applist": {"apps": [...]}}, accept both
+        legacy_file = os.path.join(os.path.dirname(self.cache_file), SteamAppIDManager.legacy_cache_file)
+        if not os.path.exists(legacy_file):
+            return
+        with open(legacy_file, 'r') as f:
+            raw_data = json.load(f)
+        if "applist" in raw_data:
+            apps = ((app["appid"], app["name"]) for app in raw_data["applist"]["apps"])
+        else:
+            apps = ((int(app_id), name) for app_id, name in raw_data.items())
+        self._store(apps)
+
+    def refresh(self, background=False):
+        '''Downloads the app list if the server has a newer one -> True if the catalogue changed.
+        Failures are reported and leave the current catalogue in place (offline use)'''
+        if background:
+            self.refresh_thread = threading.Thread(target=self.refresh, daemon=True)
+            self.refresh_thread.start()
+            return False
+        import requests #only needed here, keeps it off the scanner's import path
+        row = self._connection().execute("SELECT value FROM meta WHERE key = 'last_modified'").fetchone()
+        headers = {'If-Modified-Since': row[0]} if row and row[0] else {}
+        try:
+            response = requests.get(self.url, headers=headers, timeout=60)
+            if response.status_code == 304:
+                return False
+            response.raise_for_status()
+            apps = response.json()["applist"]["apps"]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            print("Could not update the Steam app list:", e, file=sys.stderr)
+            return False
+        self._store(((app["appid"], app["name"]) for app in apps), response.headers.get('Last-Modified'))
+        return True
+
+    def get_app_name(self, app_id):
+        try:
+            app_id = int(app_id)
+        except (TypeError, ValueError):
+            return None
+        row = self._connection().execute("SELECT name FROM apps WHERE appid = ?", (app_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_app_id(self, app_name):
+        row = self._connection().execute("SELECT appid FROM apps WHERE name = ? ORDER BY appid LIMIT 1", (app_name,)).fetchone()
+        return row[0] if row else None
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import sys
+import threading
+
+from .acf import ManifestInfo
+
+class ScanCache:
+    '''Parsed manifests from previous scans, keyed on (path, size, mtime).
+    Install directory verdicts are not cached: a directory's mtime does not change when its subdirectories
+    are emptied, so a cached verdict could hide a ghost that a fresh scan reports.
+    Rows are looked up one path at a time, so memory does not grow with the number of manifests'''
+    SCHEMA_VERSION = 5
+    COLUMNS = ('size', 'mtime_ns', 'appid', 'installdir', 'state_flags', 'size_on_disk', 'bytes_to_download',
+               'bytes_downloaded')
+    def __init__(self, path):
+        '''Raises sqlite3.OperationalError if the file cannot be opened or is locked, a corrupt file is replaced'''
+        self.path = path
+        self._local = threading.local() #sqlite connections are per thread
+        self.updates = {} #written by worker threads, one key per manifest
+        self.seen = set()
+        self._lock = threading.Lock() #libraries are checked concurrently while another one is saved
+        try:
+            self._create()
+        except sqlite3.OperationalError:
+            raise #locked or unreadable, the file may be fine, leave it alone
+        except sqlite3.DatabaseError:
+            self._connection().close()
+            self._local.con = None
+            os.remove(self.path) #corrupt cache, start over
+            self._create()
+
+    def _connection(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(self.path)
+        return con
+
+    def _create(self):
+        with self._connection() as con:
+            if con.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+                con.execute("DROP TABLE IF EXISTS manifests")
+                con.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            con.execute("""CREATE TABLE IF NOT EXISTS manifests (
+                path TEXT PRIMARY KEY, library TEXT, size INTEGER, mtime_ns INTEGER,
+                appid INTEGER, installdir TEXT, state_flags INTEGER, size_on_disk INTEGER,
+                bytes_to_download INTEGER, bytes_downloaded INTEGER)""")
+            con.execute("CREATE INDEX IF NOT EXISTS manifests_library ON manifests (library)")
+
+    def _row(self, manifest_path):
+        '''Cached columns (see COLUMNS) of a manifest, None if it is not cached or the cache is busy'''
+        try:
+            return self._connection().execute(f"SELECT {', '.join(self.COLUMNS)} FROM manifests WHERE path = ?",
+                                              (manifest_path,)).fetchone()
+        except sqlite3.Error:
+            return None #e.g. locked by another scan, a miss only costs a re-check
+
+    def get_manifest(self, manifest_path, st):
+        '''ManifestInfo if the manifest is unchanged since it was cached, else None'''
+        with self._lock:
+            self.seen.add(manifest_path)
+        row = self._row(manifest_path)
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+            return None
+        return ManifestInfo(manifest_path, *row[2:8])
+
+    def store(self, info, st):
+        row = (info.path, os.path.dirname(info.path), st.st_size, st.st_mtime_ns, info.appid,
+               info.installdir, info.state_flags, info.size_on_disk, info.bytes_to_download,
+               info.bytes_downloaded)
+        with self._lock:
+            self.updates[info.path] = row
+
+    def save(self, libraries):
+        '''Writes new rows and drops manifests that disappeared from the scanned libraries.
+        Other libraries may still be scanning, only what was seen in these ones is consumed'''
+        scanned = set(libraries)
+        with self._lock:
+            updates, self.updates = self.updates, {}
+            seen = {path for path in self.seen if os.path.dirname(path) in scanned}
+            self.seen -= seen
+        try:
+            with self._connection() as con:
+                stale = [(path,) for library in scanned
+                         for path, in con.execute("SELECT path FROM manifests WHERE library = ?", (library,))
+                         if path not in seen]
+                con.executemany(f"INSERT OR REPLACE INTO manifests VALUES ({', '.join('?' * 10)})", updates.values())
+                con.executemany("DELETE FROM manifests WHERE path = ?", stale)
+        except sqlite3.Error as e:
+            print("Could not update scan cache:", e, file=sys.stderr)
+            with self._lock:
+                self.updates = {**updates, **self.updates} #retried with the next save
+                self.seen |= seen
@@ -0,0 +1,49 @@
+'''Install state from appmanifest metadata, so most manifests are classified without walking their directory'''
+
+#EAppState bits of the StateFlags key
+STATE_UNINSTALLED = 1
+STATE_UPDATE_REQUIRED = 2
+STATE_FULLY_INSTALLED = 4
+STATE_FILES_MISSING = 32
+STATE_FILES_CORRUPT = 128
+STATE_UPDATE_RUNNING = 256
+STATE_UPDATE_PAUSED = 512
+STATE_UPDATE_STARTED = 1024
+STATE_UNINSTALLING = 2048
+STATE_BACKUP_RUNNING = 4096
+STATE_RECONFIGURING = 65536
+STATE_VALIDATING = 131072
+STATE_ADDING_FILES = 262144
+STATE_PREALLOCATING = 524288
+STATE_DOWNLOADING = 1048576
+STATE_STAGING = 2097152
+STATE_COMMITTING = 4194304
+STATE_UPDATE_STOPPING = 8388608
+STATE_BUSY = (STATE_UPDATE_RUNNING | STATE_UPDATE_PAUSED | STATE_UPDATE_STARTED | STATE_UNINSTALLING
+              | STATE_BACKUP_RUNNING | STATE_RECONFIGURING | STATE_VALIDATING | STATE_ADDING_FILES
+              | STATE_PREALLOCATING | STATE_DOWNLOADING | STATE_STAGING | STATE_COMMITTING | STATE_UPDATE_STOPPING)
+STATE_DAMAGED = STATE_FILES_MISSING | STATE_FILES_CORRUPT
+
+INSTALLED = 'installed' #complete and small by design (tools, redistributables), the directory needs no walk
+PARTIAL = 'partial' #download or update queued, running or paused, the directory may legitimately be missing or tiny
+UNINSTALLED = 'uninstalled' #Steam considers it removed, anything left in the directory is stale
+CHECK = 'check' #metadata cannot tell, only the install directory can
+
+def install_state(info, ghost_threshold):
+    '''ManifestInfo -> INSTALLED, PARTIAL, UNINSTALLED or CHECK'''
+    flags = info.state_flags
+    if flags is None:
+        return CHECK
+    installed = flags & STATE_FULLY_INSTALLED
+    if flags & STATE_BUSY:
+        return PARTIAL
+    if not installed and (flags & STATE_UPDATE_REQUIRED
+                          or 0 < (info.bytes_downloaded or 0) < (info.bytes_to_download or 0)):
+        return PARTIAL #queued or interrupted first install
+    if flags & STATE_UNINSTALLED and not installed:
+        return UNINSTALLED
+    if installed and not flags & STATE_DAMAGED and info.size_on_disk is not None and info.size_on_disk < ghost_threshold:
+        return INSTALLED #a walk could only confirm what SizeOnDisk already says
+    #Everything else claims to be installed, and a ghost is exactly a manifest that claims so
+    #over a directory whose files are gone, so the walk decides
+    return CHECK
@@ -0,0 +1,60 @@
+import os
+import shutil
+import stat
+import sys
+from collections import namedtuple
+
+from .sizing import directory_size
+
+DeleteResult = namedtuple('DeleteResult', ['path', 'bytes_freed', 'error'])
+
+def _clear_readonly(path):
+    '''Clears the read-only attribute that makes Windows refuse to delete a file or directory -> True if it was set.
+    Elsewhere the mode of the path itself never blocks its deletion, so it is left alone'''
+    if os.name != 'nt':
+        return False
+    mode = os.lstat(path).st_mode
+    if mode & stat.S_IWRITE:
+        return False
+    os.chmod(path, mode | stat.S_IWRITE)
+    return True
+
+def _retry_writable(func, path, exc):
+    '''shutil.rmtree error handler: retries a failed unlink or rmdir once the read-only attribute is cleared,
+    anything else is re-raised as it was. exc is the exception (onexc) or sys.exc_info() (onerror)'''
+    if isinstance(exc, tuple):
+        exc = exc[1]
+    if func in (os.unlink, os.remove, os.rmdir) and isinstance(exc, PermissionError) and _clear_readonly(path):
+        func(path)
+    else:
+        raise exc
+
+_RMTREE_HANDLER = 'onexc' if sys.version_info >= (3, 12) else 'onerror'
+
+def delete_paths(paths):
+    '''Removes files and directories in order, stopping at the first failure -> [DeleteResult]
+    For a ghost pair (install dir, manifest) the manifest is only removed once its directory is gone,
+    so a failure never leaves a directory without its manifest. Paths that are already gone count as removed'''
+    results = []
+    for path in paths:
+        try:
+            st = os.lstat(path)
+            if stat.S_ISDIR(st.st_mode):
+                size = directory_size(path)[0]
+                shutil.rmtree(path, **{_RMTREE_HANDLER: _retry_writable})
+            else:
+                size = st.st_size
+                try:
+                    os.unlink(path)
+                except PermissionError:
+                    if not _clear_readonly(path):
+                        raise
+                    os.unlink(path)
+        except FileNotFoundError:
+            results.append(DeleteResult(path, 0, None))
+        except OSError as e:
+            results.append(DeleteResult(path, 0, str(e)))
+            break
+        else:
+            results.append(DeleteResult(path, size, None))
+    return results
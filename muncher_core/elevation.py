@@ -0,0 +1,30 @@
+'''Windows console and elevation helpers, ctypes is only loaded when they are called'''
+import sys
+
+def enable_ansi_colors():
+    if sys.platform.startswith('win'):
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
+
+def is_admin():
+    try:
+        import ctypes
+        return ctypes.windll.shell32.IsUserAnAdmin()
+    except:
+        return False
+
+def run_as_admin():
+    if not is_admin():
+        if sys.platform.startswith('win'):
+            try:
+                import ctypes
+                ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
+                sys.exit(0)
+            except Exception as e:
+                print("Failed to elevate process:", e)
+                sys.exit(1)
+        else:
+            print("Elevation is only supported on Windows.")
+    else:
+        print("Already running as admin.")
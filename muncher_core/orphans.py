@@ -0,0 +1,48 @@
+'''Reverse sweep: entries of a library's content directories that no manifest references'''
+import os
+import re
+
+CONTENT_DIRS = ('common', 'downloading', 'shadercache') #common/ is keyed by installdir, the others by appid
+_APPID_NAME = re.compile(r'(?:state_)?(\d+)') #downloading/<appid>, downloading/state_<appid>_<depot>.patch, shadercache/<appid>
+
+def appid_from_name(name):
+    '''downloading/ or shadercache/ entry name -> appid, None if it does not start with one'''
+    match = _APPID_NAME.match(name)
+    return int(match.group(1)) if match else None
+
+class ManifestIndex:
+    '''installdirs and appids referenced by one library's manifests, built in one pass over its Findings'''
+    def __init__(self, findings=()):
+        self.installdirs = set() #normcased, Windows treats them case insensitively
+        self.appids = set()
+        for finding in findings:
+            self.add(finding)
+
+    def add(self, finding):
+        if finding.appid is not None:
+            self.appids.add(finding.appid)
+        if finding.installdir:
+            self.installdirs.add(os.path.normcase(finding.installdir))
+
+    def references(self, content_dir, name):
+        '''False only for entries known to belong to no manifest'''
+        if content_dir == 'common':
+            return os.path.normcase(name) in self.installdirs
+        appid = appid_from_name(name)
+        return appid is None or appid in self.appids #names we cannot attribute are left alone
+
+def iter_unreferenced(library, index, stats=None):
+    '''steamapps directory, ManifestIndex -> (content dir, DirEntry) for every unreferenced entry.
+    Each content directory is listed once and yielded in name order, symlinks are skipped'''
+    for content_dir in CONTENT_DIRS:
+        if stats:
+            stats.count('listdir')
+        try:
+            it = os.scandir(os.path.join(library, content_dir))
+        except OSError: #most libraries have no downloading/ or shadercache/
+            continue
+        with it:
+            entries = sorted((entry for entry in it if not entry.is_symlink() and not index.references(content_dir, entry.name)),
+                             key=lambda entry: entry.name)
+        for entry in entries:
+            yield content_dir, entry
@@ -0,0 +1,168 @@
+'''Reversible removal: findings are moved into a quarantine folder inside their library and every move is journaled.
+Moves are same-volume os.replace calls, so quarantining a 100GB directory costs the same as a manifest'''
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from .deleter import delete_paths
+
+QUARANTINE_DIR = '.muncher_quarantine' #inside the steamapps directory, next to common/, so moves stay on one volume
+JOURNAL_FILE = 'journal.jsonl'
+MoveResult = namedtuple('MoveResult', ['path', 'destination', 'error'])
+
+def new_batch_id():
+    '''Sortable id shared by every library touched in one run'''
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+class Quarantine:
+    '''One library's quarantine folder and its append-only journal (one JSON record per line).
+    Every operation is journaled as 'begin' before it touches the disk and as 'done' or 'failed' after,
+    each record fsynced, so replay() can settle whatever a crash interrupted.
+    Paths are journaled relative to the library, so neither the working directory nor the mount point matters'''
+    def __init__(self, library):
+        self.library = os.path.abspath(library)
+        self.root = os.path.join(library, QUARANTINE_DIR)
+        self.journal_path = os.path.join(self.root, JOURNAL_FILE)
+        self._lock = threading.Lock() #worker threads share one journal per library
+
+    def _append(self, batch, op, state, src, dst=None, error=None):
+        record = {'time': time.time(), 'batch': batch, 'op': op, 'state': state,
+                  'src': os.path.relpath(src, self.library), 'dst': dst and os.path.relpath(dst, self.library)}
+        if error is not None:
+            record['error'] = error
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def records(self):
+        '''Journal records in order with absolute paths, a line torn by a crash is skipped'''
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        records = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            for key in ('src', 'dst'):
+                if record.get(key):
+                    record[key] = os.path.join(self.library, record[key])
+            records.append(record)
+        return records
+
+    def replay(self):
+        '''Settles operations that were begun but never finished -> number settled.
+        A move counts as done if its source is gone and its destination exists, else as failed'''
+        try:
+            with open(self.journal_path, 'rb+') as f:
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        f.write(b'\n') #terminate a torn record so the next append starts on its own line
+        except FileNotFoundError:
+            return 0
+        pending = {}
+        for record in self.records():
+            key = (record['batch'], record['op'], record['src'], record['dst'])
+            if record['state'] == 'begin':
+                pending[key] = record
+            else:
+                pending.pop(key, None)
+        for batch, op, src, dst in pending:
+            if op == 'purge':
+                self._purge(batch) #deleting again is idempotent
+            elif os.path.lexists(dst) and not os.path.lexists(src):
+                self._append(batch, op, 'done', src, dst)
+            else:
+                self._append(batch, op, 'failed', src, dst, "interrupted before the move")
+        return len(pending)
+
+    def batches(self):
+        '''-> {batch: {original path: quarantined path}} for everything still in quarantine'''
+        batches = {}
+        for record in self.records():
+            if record['state'] != 'done':
+                continue
+            items = batches.setdefault(record['batch'], {})
+            if record['op'] == 'quarantine':
+                items[record['src']] = record['dst']
+            elif record['op'] == 'restore':
+                items.pop(record['dst'], None)
+            elif record['op'] == 'purge':
+                items.clear()
+        return {batch: items for batch, items in batches.items() if items}
+
+    def _move(self, batch, op, src, dst):
+        '''Journaled os.replace -> MoveResult, never overwrites dst'''
+        if os.path.lexists(dst):
+            return MoveResult(src, dst, f"{dst} already exists")
+        self._append(batch, op, 'begin', src, dst)
+        try:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.replace(src, dst)
+        except OSError as e:
+            self._append(batch, op, 'failed', src, dst, str(e))
+            return MoveResult(src, dst, str(e))
+        self._append(batch, op, 'done', src, dst)
+        return MoveResult(src, dst, None)
+
+    def quarantine(self, batch, paths):
+        '''Moves paths of this library into the batch folder in order, stopping at the first failure -> [MoveResult].
+        Same order contract as delete_paths: a manifest is only moved once its directory is'''
+        results = []
+        for path in map(os.path.abspath, paths):
+            if not os.path.lexists(path):
+                results.append(MoveResult(path, None, None)) #already gone counts as removed
+                continue
+            destination = os.path.join(self.root, batch, os.path.relpath(path, self.library))
+            results.append(self._move(batch, 'quarantine', path, destination))
+            if results[-1].error is not None:
+                break
+        return results
+
+    def restore(self, batch):
+        '''Moves a batch back where it came from -> [MoveResult]. Paths that were recreated meanwhile
+        (e.g. Steam reinstalled the game) are not overwritten and stay in quarantine'''
+        items = self.batches().get(batch, {})
+        results = [self._move(batch, 'restore', quarantined, original) for original, quarantined in items.items()]
+        for directory, _, _ in os.walk(os.path.join(self.root, batch), topdown=False):
+            try:
+                os.rmdir(directory) #only the folders the restore emptied
+            except OSError:
+                pass
+        return results
+
+    def _purge(self, batch):
+        batch_dir = os.path.join(self.root, batch)
+        self._append(batch, 'purge', 'begin', batch_dir)
+        results = delete_paths([batch_dir])
+        error = results[0].error
+        self._append(batch, 'purge', 'failed' if error else 'done', batch_dir, error=error)
+        return results
+
+    def purge(self, batch):
+        '''Deletes a batch for good -> [DeleteResult], [] if the batch has nothing left in quarantine'''
+        if batch not in self.batches():
+            return []
+        return self._purge(batch)
+
+_quarantines = {}
+_quarantines_lock = threading.Lock()
+
+def open_quarantine(library):
+    '''library -> its Quarantine, replayed on first use in this process'''
+    library = os.path.abspath(library)
+    with _quarantines_lock:
+        quarantine = _quarantines.get(library)
+        if quarantine is None:
+            quarantine = _quarantines[library] = Quarantine(library)
+            quarantine.replay()
+        return quarantine
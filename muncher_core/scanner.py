@@ -0,0 +1,403 @@
+'''Library discovery and the manifest scan pipeline'''
+import os
+import queue
+import re
+import sqlite3
+import stat
+import subprocess
+import sys
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from .acf import parse_manifest, libraries_from_vdf
+from .cache import ScanCache
+from .classify import install_state, INSTALLED, PARTIAL, UNINSTALLED
+from .deleter import delete_paths
+from .orphans import ManifestIndex, appid_from_name, iter_unreferenced
+from .sizing import directory_size
+
+Finding = namedtuple('Finding', ['manifest', 'appid', 'installdir', 'verdict', 'game_dir', 'bytes'])
+VERDICTS = ('ok', 'unlinked', 'ghost', 'stale', 'partial', 'orphan', 'error') #game_dir is set for ghosts, stale installs and orphans
+REMOVABLE = ('unlinked', 'ghost') #removed unattended; stale installs and orphans can be large, so they are only reported
+#partial: a download or update is under way or was interrupted, but its install directory is missing. Only reported,
+#removing it could cancel a queued install
+#error: the manifest or its install directory could not be read, the reason goes to Muncher.report
+#orphans have no manifest, game_dir is the unreferenced entry
+_DONE = object() #end of one library's results
+#bytes is what removing the finding frees, estimated from SizeOnDisk for stale installs
+
+def steamapps_dir(root):
+    '''Steam root, library root or steamapps path -> normalized steamapps directory, None if missing'''
+    root = os.path.normpath(os.path.expanduser(root)) #'lib/steamapps/' must match the dirname of its manifests
+    if os.path.basename(root).lower() != 'steamapps':
+        root = os.path.join(root, 'steamapps')
+    return root if os.path.isdir(root) else None
+
+def registry_steam_path():
+    '''Steam install path from the Windows registry, None elsewhere'''
+    if not sys.platform.startswith('win'):
+        return None
+    import winreg
+    try:
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Valve\Steam") as key:
+            return winreg.QueryValueEx(key, "SteamPath")[0]
+    except OSError:
+        return None
+
+class Muncher:
+    LIBRARY_PATH_FILE = "steam_libs.yaml"
+    CONFIG_FILE = "muncher.yaml" #optional, 'libraries' lists explicit library roots
+    POSIX_STEAM_ROOTS = [
+    '~/.local/share/Steam',
+    '~/.steam/steam',
+    '~/.var/app/com.valvesoftware.Steam/.local/share/Steam', #flatpak
+    '~/Library/Application Support/Steam', #macOS
+    ]
+    SCAN_CACHE_FILE = "steam_scan.db" #lives next to LIBRARY_PATH_FILE
+    MAX_WORKERS = 8 #concurrent manifest checks per library
+    GHOST_THRESHOLD = 2048 #bytes, install directories below this are leftovers
+    GHOST_FILE_LIMIT = 64 #entries, a directory with more than this is never a leftover
+    def __init__(self, max_workers=MAX_WORKERS, use_cache=True, ghost_threshold=GHOST_THRESHOLD, library_roots=None,
+                 out=None, stats=None):
+        self.out = out or sys.stdout #status messages, batch mode points this at stderr
+        self.stats = stats #optional ScanStats, filled in by every stage of the scan
+        self.max_workers = max(1, max_workers)
+        self.library_roots = list(library_roots or self.load_config().get('libraries') or [])
+        self.ghost_threshold = ghost_threshold
+        self.cache = self.open_cache() if use_cache else None
+        self.scrap_files = []
+        self.findings = {} #manifest path -> Finding, filled by load_manifests
+        self.drives = self.get_disks()
+        self.libraries = []
+        self.unlinked_manifests = []
+
+    def load(self):
+        '''Eager scan of every library for the wizard -> unlinked manifest paths'''
+        self.libraries = self.retrieve_libraries(self.drives)
+        self.unlinked_manifests = self.load_manifests(self.libraries)
+        return self.unlinked_manifests
+
+    def report(self, message):
+        print(message, file=self.out)
+
+    def open_cache(self):
+        '''ScanCache, None if the file is locked or cannot be opened (the scan then runs without it)'''
+        try:
+            return ScanCache(self.SCAN_CACHE_FILE)
+        except sqlite3.OperationalError as e:
+            self.report(f"\033[91mScan cache {self.SCAN_CACHE_FILE} unavailable ({e}), scanning without it\033[0m")
+            return None
+
+    def _stage(self, name, path=None):
+        return self.stats.stage(name, path) if self.stats else nullcontext()
+
+    def _count(self, name, amount=1):
+        if self.stats:
+            self.stats.count(name, amount)
+
+    @staticmethod
+    def list_disks():
+        '''['C:\\', 'D:\\'], [] where fsutil is not available'''
+        if not sys.platform.startswith('win'):
+            return []
+        stdout_raw = subprocess.check_output(['fsutil', 'fsinfo', 'drives'])
+        std_utf8 = stdout_raw.decode('utf-8')
+        return [item.strip() for item in std_utf8.split() if re.match(r'[A-Za-z]{1}:\\', item) is not None]
+
+    def get_disks(self):
+        '''Drives to look for libraries on, front-ends may override this to prompt'''
+        return self.list_disks()
+
+    def load_config(self):
+        '''CONFIG_FILE -> dict, e.g. {'libraries': ['~/.local/share/Steam/steamapps']}'''
+        if not os.path.exists(self.CONFIG_FILE):
+            return {}
+        import yaml
+        with open(self.CONFIG_FILE, 'r') as f:
+            return yaml.safe_load(f) or {}
+
+    def steam_roots(self, drives):
+        '''Candidate Steam install directories, whose steamapps holds libraryfolders.vdf'''
+        roots = [registry_steam_path()]
+        for drive in drives:
+            roots.append(os.path.join(drive, '/Program Files (x86)/Steam'))
+            roots.append(os.path.join(drive, '/Program Files/Steam'))
+        roots.extend(os.path.expanduser(root) for root in self.POSIX_STEAM_ROOTS)
+        return [root for root in roots if root]
+
+    def discover_libraries(self, drives):
+        '''Libraries listed in Steam's own libraryfolders.vdf'''
+        libraries = []
+        for root in self.steam_roots(drives):
+            vdf_path = os.path.join(root, 'steamapps', 'libraryfolders.vdf')
+            self._count('stat')
+            if os.path.isfile(vdf_path):
+                self._count('open')
+                libraries.extend(libraries_from_vdf(vdf_path))
+        if drives: #only the selected drives
+            selected = {os.path.splitdrive(drive)[0].lower() for drive in drives}
+            libraries = [library for library in libraries if os.path.splitdrive(library)[0].lower() in selected]
+        self._count('stat', len(libraries))
+        return [library for library in libraries if os.path.isdir(library)]
+
+    def probe_libraries(self, drives):
+        '''Fallback for installs without libraryfolders.vdf'''
+        libraries = []
+        common_paths = [
+        '/Program Files (x86)/Steam/steamapps',
+        '/Program Files/Steam/steamapps',
+        '/SteamLibrary/steamapps',
+        '/Games/Steam/steamapps',
+        ]
+        for drive in drives:
+            for common_path in common_paths:
+                self._count('stat')
+                if os.path.exists(os.path.join(drive, common_path)):
+                    libraries.append(os.path.join(drive, common_path)) 
+        return libraries
+
+    def find_libraries(self, drives):
+        '''Explicit library roots if any were given, else libraryfolders.vdf, else probing'''
+        with self._stage('find_libraries'):
+            libraries = self._find_libraries(drives)
+        self.report(f"\033[92;1mFound\033[0m \033[1m{len(libraries)}\033[0m \033[92;1mSteam libraries!\033[0m")
+        return libraries
+
+    def _find_libraries(self, drives):
+        if self.library_roots:
+            libraries = []
+            for root in self.library_roots:
+                self._count('stat')
+                library = steamapps_dir(root)
+                if library is None:
+                    self.report(f"\033[91mNo Steam library at {root}\033[0m")
+                else:
+                    libraries.append(library)
+        else:
+            libraries = self.discover_libraries(drives) or self.probe_libraries(drives)
+        unique = {}
+        for library in libraries:
+            unique.setdefault(os.path.normcase(os.path.realpath(library)), library) #~/.steam/steam is usually a symlink
+        return list(unique.values())
+
+    def retrieve_libraries(self, drives, update=True):
+        import yaml
+        if update:
+            libraries = self.find_libraries(drives)
+            with open(self.LIBRARY_PATH_FILE, 'w') as f:
+                yaml.safe_dump(libraries, f)
+            return libraries
+        elif os.path.exists(self.LIBRARY_PATH_FILE):
+            with open(self.LIBRARY_PATH_FILE, 'r') as f:
+                return yaml.safe_load(f)
+        else:
+            return self.find_libraries(drives)
+        
+    @staticmethod
+    def is_ghost_directory(directory, threshold=GHOST_THRESHOLD, file_limit=GHOST_FILE_LIMIT):
+        '''Bool if directory is < threshold bytes in at most file_limit entries -> True'''
+        #!Some older games may store saves in installation directory.
+        #!Threshold is arbitrary, but unlikely to delete these saves at 2KB
+        size, entries, complete = directory_size(directory, threshold, file_limit)
+        return complete and size < threshold
+
+    @staticmethod
+    def get_game_dir(manifest_path):
+        '''manifest path -> installation directory'''
+        return parse_manifest(manifest_path).installdir
+
+    def check_manifest(self, manifest_path):
+        '''manifest path -> Finding
+        No side effects, so it is safe to run from worker threads.
+        An unreadable manifest or install directory is reported and gets the 'error' verdict, the scan goes on'''
+        with self._stage('manifest', manifest_path):
+            try:
+                return self._check_manifest(manifest_path)
+            except OSError as e: #e.g. a dangling symlink, a permission error, or Steam removed it meanwhile
+                self.report(f"\033[91mCould not check {manifest_path}: {e}\033[0m")
+                return Finding(manifest_path, None, None, 'error', None, 0)
+
+    def _check_manifest(self, manifest_path):
+        self._count('stat')
+        st = os.stat(manifest_path)
+        info = self.cache.get_manifest(manifest_path, st) if self.cache else None
+        if info is None:
+            with self._stage('parse'):
+                info = parse_manifest(manifest_path, stats=self.stats)
+            if self.cache:
+                self.cache.store(info, st)
+        state = install_state(info, self.ghost_threshold)
+        def finding(verdict, game_dir=None, size=0):
+            return Finding(manifest_path, info.appid, info.installdir, verdict, game_dir, size)
+        if info.installdir is None:
+            return finding('unlinked', size=st.st_size) #nothing to link to
+        game_dir = os.path.join(os.path.dirname(manifest_path), 'common', info.installdir)
+        self._count('stat')
+        try:
+            dir_st = os.stat(game_dir)
+        except FileNotFoundError:
+            #A queued download has its manifest before its directory, but so does an interrupted one whose
+            #folder was deleted, so it is reported without being removed
+            return finding('partial' if state == PARTIAL else 'unlinked', size=st.st_size)
+        if not stat.S_ISDIR(dir_st.st_mode) or state in (INSTALLED, PARTIAL):
+            return finding('ok')
+        if state == UNINSTALLED:
+            return finding('stale', game_dir, st.st_size + (info.size_on_disk or 0))
+        #Never cached: emptying a subdirectory leaves the install directory's mtime alone, and the
+        #bounded walk stops within a few entries of a real install anyway.
+        #Same test as is_ghost_directory, but the size is kept for the finding
+        with self._stage('walk', game_dir):
+            size, entries, complete = directory_size(game_dir, self.ghost_threshold, self.GHOST_FILE_LIMIT, self.stats)
+        if complete and size < self.ghost_threshold:
+            return finding('ghost', game_dir, st.st_size + size)
+        return finding('ok')
+
+    def is_unlinked(self, manifest_path):
+        finding = self.check_manifest(manifest_path)
+        self._collect(finding)
+        return finding.verdict == 'unlinked'
+
+    def _collect(self, finding):
+        '''Keeps a finding for the wizard's review and removal steps'''
+        if finding.verdict != 'ok':
+            self.findings[finding.manifest] = finding
+        if finding.verdict == 'ghost':
+            self.scrap_files.extend([finding.game_dir, finding.manifest])
+
+    @staticmethod
+    def list_manifests(library, stats=None):
+        '''library -> sorted appmanifest paths'''
+        if stats:
+            stats.count('listdir')
+            with stats.stage('list_manifests', library):
+                return Muncher.list_manifests(library)
+        return sorted(os.path.join(library, appman) for appman in os.listdir(library) if appman.startswith('appmanifest_') and appman.endswith(".acf"))
+
+    def ordered_map(self, fn, items, window_size=None):
+        '''Lazy pool.map: results in input order, at most window_size (default 2 * max_workers) items in flight.
+        Use window_size=1 for endless inputs that must be answered as they arrive, e.g. watch mode'''
+        #Checks are I/O bound (open/stat/walk), so threads overlap the waits on disk
+        window_size = window_size or 2 * self.max_workers
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            window = deque()
+            for item in items:
+                window.append(pool.submit(fn, item))
+                if len(window) >= window_size:
+                    yield window.popleft().result()
+            while window:
+                yield window.popleft().result()
+
+    def iter_libraries(self):
+        '''Stage 1: steamapps directories'''
+        yield from self.find_libraries(self.drives)
+
+    def _feed(self, library, results, stop):
+        '''Checks one library on its own pool into a bounded queue, runs on a thread per library'''
+        try:
+            for finding in self.ordered_map(self.check_manifest, Muncher.list_manifests(library, self.stats)):
+                results.put(finding) #blocks while the consumer is busy with earlier libraries
+                if stop.is_set():
+                    break
+        except Exception as e:
+            results.put(e)
+            return
+        results.put(_DONE)
+
+    def _drain(self, library, results):
+        while (item := results.get()) is not _DONE:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        if self.cache:
+            self.cache.save([library])
+
+    def iter_library_checks(self, libraries=None):
+        '''Stages 2 & 3 -> (library, iterator of a Finding for every manifest, including 'ok') in library order.
+        Every library is checked at the same time on its own pool, as they are usually on different drives,
+        but results are consumed library by library, so they stream in a deterministic order. A library
+        runs at most 2 * max_workers results ahead of the consumer, so memory does not grow with library size.
+        Each iterator must be exhausted before the next one is used'''
+        stop = threading.Event()
+        feeds = []
+        try:
+            for library in (self.iter_libraries() if libraries is None else libraries):
+                results = queue.Queue(maxsize=2 * self.max_workers)
+                thread = threading.Thread(target=self._feed, args=(library, results, stop), daemon=True)
+                thread.start()
+                feeds.append((library, results, thread))
+            for library, results, _ in feeds:
+                yield library, self._drain(library, results)
+        finally:
+            stop.set() #the consumer stopped early, unblock the feeders so their pools can shut down
+            for _, results, thread in feeds:
+                while thread.is_alive():
+                    try:
+                        results.get(timeout=0.05)
+                    except queue.Empty:
+                        pass
+
+    def iter_checked(self, libraries=None):
+        '''Finding for every manifest of every library, including 'ok', see iter_library_checks'''
+        for _, findings in self.iter_library_checks(libraries):
+            yield from findings
+
+    def scan(self, libraries=None, orphans=False):
+        '''Lazily yields a Finding for every unlinked manifest, ghost directory and stale install.
+        orphans: also sweep each library for content no manifest references, see find_orphans'''
+        for library, findings in self.iter_library_checks(libraries):
+            index = ManifestIndex()
+            unreadable = False
+            for finding in findings:
+                index.add(finding)
+                unreadable |= finding.verdict == 'error'
+                if finding.verdict != 'ok':
+                    yield finding
+            if orphans and unreadable: #what the unreadable manifest references is unknown, its game would look orphaned
+                self.report(f"\033[91mSkipped the orphan sweep of {library}, some manifests could not be read\033[0m")
+            elif orphans:
+                yield from self.find_orphans(library, index)
+
+    def _orphan(self, item):
+        '''(content dir, DirEntry) -> orphan Finding, sized by a full walk'''
+        content_dir, entry = item
+        with self._stage('walk', entry.path):
+            if entry.is_dir(follow_symlinks=False):
+                size = directory_size(entry.path, stats=self.stats)[0]
+            else:
+                self._count('stat')
+                size = entry.stat(follow_symlinks=False).st_size
+        if content_dir == 'common':
+            return Finding(None, None, entry.name, 'orphan', entry.path, size)
+        return Finding(None, appid_from_name(entry.name), None, 'orphan', entry.path, size)
+
+    def find_orphans(self, library, index):
+        '''library, ManifestIndex of all its manifests -> orphan Findings for entries of common/,
+        downloading/ and shadercache/ that no manifest references, sized on max_workers threads'''
+        with self._stage('orphans', library):
+            unreferenced = list(iter_unreferenced(library, index, self.stats))
+        yield from self.ordered_map(self._orphan, unreferenced)
+
+    def load_manifests(self, libraries):
+        '''Scans everything up front for the wizard -> unlinked manifest paths'''
+        unlinked_manifest_paths = []
+        manifest_count = 0
+        for finding in self.iter_checked(libraries):
+            manifest_count += 1
+            self._collect(finding)
+            if finding.verdict == 'unlinked':
+                unlinked_manifest_paths.append(finding.manifest)
+        self.report(f"\033[92;1mFound\033[0m \033[1m{manifest_count}\033[0m \033[92;1m app manifests!\033[0m")
+        return unlinked_manifest_paths
+    
+    @staticmethod
+    def finding_paths(finding):
+        '''Finding -> paths to delete, in order'''
+        return tuple(path for path in (finding.game_dir, finding.manifest) if path)
+
+    def delete(self, targets):
+        '''[(path, ...), ...] -> [[DeleteResult, ...], ...] in target order
+        Each target is removed by delete_paths, targets run on max_workers threads'''
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(delete_paths, targets))
@@ -0,0 +1,35 @@
+import os
+
+def directory_size(directory, byte_limit=None, file_limit=None, stats=None):
+    '''directory -> (bytes, entries, complete)
+    Walks with os.scandir and an explicit stack, reusing the DirEntry stat results.
+    Stops as soon as byte_limit or file_limit is crossed, complete is then False.
+    Unreadable subdirectories are skipped and also leave complete False.
+    Symlinks are neither followed nor counted.
+    stats: optional ScanStats, counts a listdir per scandir and a stat per file'''
+    size = 0
+    entries = 0
+    complete = True
+    stack = [directory]
+    while stack:
+        if stats:
+            stats.count('listdir')
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            complete = False
+            continue
+        with it:
+            for entry in it:
+                if entry.is_symlink():
+                    continue
+                entries += 1
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    if stats:
+                        stats.count('stat')
+                    size += entry.stat(follow_symlinks=False).st_size
+                if (byte_limit is not None and size >= byte_limit) or (file_limit is not None and entries > file_limit):
+                    return size, entries, False #early return
+    return size, entries, complete
@@ -0,0 +1,79 @@
+'''Scan instrumentation: per-stage time, I/O call counters and the slowest items'''
+import heapq
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+COUNTERS = ('stat', 'open', 'listdir', 'bytes_read')
+
+class ScanStats:
+    '''Collected by Muncher(stats=ScanStats()) and the functions it calls. Safe to share between workers.
+    Stage times are summed over worker threads, so they can add up to more than the wall time'''
+    SLOWEST = 10 #kept per kind
+
+    def __init__(self, trace_file=None):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stage_seconds = defaultdict(float)
+        self.stage_calls = Counter()
+        self.counters = Counter(dict.fromkeys(COUNTERS, 0))
+        self._slowest = defaultdict(list) #kind -> min-heap of (seconds, path)
+        self._trace = open(trace_file, 'a') if trace_file else None
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    @contextmanager
+    def stage(self, name, path=None):
+        '''Times a stage. With a path, also ranks it among the slowest of its kind and traces it'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.stage_seconds[name] += seconds
+                self.stage_calls[name] += 1
+                if path is not None:
+                    slowest = self._slowest[name]
+                    if len(slowest) < self.SLOWEST:
+                        heapq.heappush(slowest, (seconds, path))
+                    elif seconds > slowest[0][0]:
+                        heapq.heapreplace(slowest, (seconds, path))
+                if self._trace is not None:
+                    self._trace.write(json.dumps({'stage': name, 'path': path, 'start': round(start - self.started, 6),
+                                                  'seconds': round(seconds, 6)}) + '\n')
+
+    def slowest(self, kind):
+        '''-> [(seconds, path)], slowest first'''
+        with self._lock:
+            return sorted(self._slowest[kind], reverse=True)
+
+    def summary(self):
+        with self._lock:
+            return {'wall_seconds': round(time.perf_counter() - self.started, 6),
+                    'stages': {name: {'seconds': round(seconds, 6), 'calls': self.stage_calls[name]}
+                               for name, seconds in self.stage_seconds.items()},
+                    'counters': dict(self.counters),
+                    'slowest': {kind: [[round(seconds, 6), path] for seconds, path in sorted(items, reverse=True)]
+                                for kind, items in self._slowest.items()}}
+
+    def format(self):
+        '''Human readable summary for --profile'''
+        summary = self.summary()
+        lines = [f"Scan profile ({summary['wall_seconds']:.3f}s wall)"]
+        for name, stage in summary['stages'].items():
+            lines.append(f"  {name:<16}{stage['seconds']:>10.3f}s{stage['calls']:>10} calls")
+        lines.append("  " + ", ".join(f"{name}: {value}" for name, value in summary['counters'].items()))
+        for kind, items in summary['slowest'].items():
+            lines.append(f"  slowest {kind}:")
+            lines.extend(f"    {seconds:>8.3f}s  {path}" for seconds, path in items)
+        return '\n'.join(lines)
+
+    def close(self):
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
@@ -0,0 +1,216 @@
+'''Watch mode: re-validates only the manifests and install directories that changed.
+Only each steamapps directory and its common/ are watched, never the install trees themselves'''
+import os
+import select
+import struct
+import sys
+import time
+
+MANIFEST_PREFIX = 'appmanifest_'
+MANIFEST_SUFFIX = '.acf'
+
+def is_manifest_name(name):
+    return name.startswith(MANIFEST_PREFIX) and name.endswith(MANIFEST_SUFFIX)
+
+class InotifyBackend:
+    '''Linux inotify through libc, blocks in select() so an idle watch costs no CPU'''
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ONLYDIR = 0x01000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+    _EVENT = struct.Struct('iIII') #wd, mask, cookie, len, then len bytes of name
+    idle_timeout = 1.0 #only to notice stop()
+
+    def __init__(self):
+        import ctypes, ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._get_errno = ctypes.get_errno
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(self._get_errno(), "inotify_init1 failed")
+        self._paths = {} #watch descriptor -> directory
+
+    def add(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            raise OSError(self._get_errno(), "inotify_add_watch failed", directory)
+        self._paths[wd] = directory
+
+    def wait(self, timeout):
+        '''-> [(directory, name)], None for the name if events were dropped'''
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                events.extend((directory, None) for directory in self._paths.values())
+            elif wd in self._paths and name:
+                events.append((self._paths[wd], name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingBackend:
+    '''Fallback: stats each watched directory every interval and lists it only when its mtime moved.
+    Steam writes manifests to a temp file and renames them, which bumps the directory mtime'''
+    def __init__(self, interval):
+        self.idle_timeout = interval
+        self._snapshots = {} #directory -> (mtime_ns, names)
+
+    def _snapshot(self, directory):
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None, {}
+        previous = self._snapshots.get(directory)
+        if previous is not None and previous[0] == mtime_ns:
+            return mtime_ns, previous[1]
+        try:
+            with os.scandir(directory) as it:
+                #Subdirectories only count by name, common/ has its own snapshot
+                return mtime_ns, {entry.name: None if entry.is_dir(follow_symlinks=False)
+                                  else entry.stat(follow_symlinks=False).st_mtime_ns for entry in it}
+        except OSError:
+            return mtime_ns, {}
+
+    def add(self, directory):
+        self._snapshots[directory] = self._snapshot(directory)
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        events = []
+        for directory, (mtime_ns, names) in list(self._snapshots.items()):
+            snapshot = self._snapshot(directory)
+            if snapshot[0] == mtime_ns and snapshot[1] is names:
+                continue
+            current = snapshot[1]
+            events.extend((directory, name) for name in names.keys() ^ current.keys())
+            events.extend((directory, name) for name in names.keys() & current.keys() if names[name] != current[name])
+            self._snapshots[directory] = snapshot
+        return events
+
+    def close(self):
+        pass
+
+class LibraryWatcher:
+    '''Yields Findings for the libraries, then again whenever a change touches a manifest.
+    Events are debounced: re-checks run once nothing has changed for `debounce` seconds'''
+    DEBOUNCE = 2.0 #seconds
+    POLL_INTERVAL = 5.0 #seconds, polling backend only
+
+    def __init__(self, muncher, libraries, debounce=DEBOUNCE, poll_interval=POLL_INTERVAL, polling=False):
+        self.muncher = muncher
+        self.libraries = list(libraries)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.polling = polling or not sys.platform.startswith('linux')
+        self._stopped = False
+        self._installdirs = {} #(library, normcased installdir) -> {manifest paths}
+        self._manifest_dirs = {} #manifest path -> key in _installdirs
+
+    def stop(self):
+        self._stopped = True
+
+    def _backend(self):
+        if not self.polling:
+            try:
+                return InotifyBackend()
+            except (OSError, AttributeError) as e: #AttributeError: libc without inotify
+                self.muncher.report(f"inotify unavailable ({e}), polling every {self.poll_interval}s")
+        return PollingBackend(self.poll_interval)
+
+    def _index(self, finding):
+        library = os.path.dirname(finding.manifest)
+        key = (library, os.path.normcase(finding.installdir)) if finding.installdir else None
+        old_key = self._manifest_dirs.pop(finding.manifest, None)
+        if old_key is not None:
+            self._installdirs.get(old_key, set()).discard(finding.manifest)
+        if key is not None:
+            self._installdirs.setdefault(key, set()).add(finding.manifest)
+            self._manifest_dirs[finding.manifest] = key
+
+    def _forget(self, manifest_path):
+        key = self._manifest_dirs.pop(manifest_path, None)
+        if key is not None:
+            self._installdirs[key].discard(manifest_path)
+
+    def _watch_library(self, backend, library):
+        backend.add(library)
+        common_dir = os.path.join(library, 'common')
+        if os.path.isdir(common_dir):
+            backend.add(common_dir)
+
+    def _affected(self, backend, events):
+        '''[(directory, name)] -> manifest paths to re-check'''
+        manifests = set()
+        for directory, name in events:
+            if directory in self.libraries:
+                library = directory
+                if name is None or name == 'common': #overflow, or common/ itself came or went
+                    if name == 'common' and os.path.isdir(os.path.join(library, 'common')):
+                        backend.add(os.path.join(library, 'common'))
+                    manifests.update(self.muncher.list_manifests(library, self.muncher.stats))
+                elif is_manifest_name(name):
+                    manifests.add(os.path.join(library, name))
+            else:
+                library = os.path.dirname(directory)
+                if name is None:
+                    manifests.update(self.muncher.list_manifests(library, self.muncher.stats))
+                else:
+                    manifests.update(self._installdirs.get((library, os.path.normcase(name)), ()))
+        return manifests
+
+    def _recheck(self, manifests):
+        for manifest_path in sorted(manifests):
+            if not os.path.exists(manifest_path):
+                self._forget(manifest_path)
+                continue
+            finding = self.muncher.check_manifest(manifest_path)
+            if finding.verdict == 'error' and not os.path.lexists(manifest_path):
+                self._forget(manifest_path) #removed between the exists check and the check itself
+                continue
+            self._index(finding)
+            if finding.verdict != 'ok':
+                yield finding
+        if self.muncher.cache:
+            self.muncher.cache.save([]) #partial scan, nothing to prune
+
+    def watch(self):
+        '''Full scan first, then findings for changed manifests until stop()'''
+        backend = self._backend()
+        try:
+            for library in self.libraries: #subscribe first so nothing is missed during the scan
+                self._watch_library(backend, library)
+            for finding in self.muncher.iter_checked(self.libraries):
+                self._index(finding)
+                if finding.verdict != 'ok':
+                    yield finding
+            pending = []
+            last_event = 0.0
+            while not self._stopped:
+                events = backend.wait(self.debounce if pending else backend.idle_timeout)
+                if events:
+                    pending.extend(events)
+                    last_event = time.monotonic()
+                elif pending and time.monotonic() - last_event >= self.debounce:
+                    yield from self._recheck(self._affected(backend, pending))
+                    pending = []
+        finally:
+            backend.close()
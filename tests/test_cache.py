@@ -0,0 +1,38 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from muncher_core import Muncher
+
+class CachedScanTest(unittest.TestCase):
+    '''A scan with the cache must report exactly what a fresh scan reports'''
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='muncher-cache-')
+        self.addCleanup(shutil.rmtree, self.root)
+        self.library = os.path.join(self.root, 'steamapps')
+        self.data = os.path.join(self.library, 'common', 'Linked', 'bin', 'a.dat')
+        os.makedirs(os.path.dirname(self.data))
+        with open(self.data, 'wb') as f:
+            f.write(b'\0' * 100000)
+        with open(os.path.join(self.library, 'appmanifest_1.acf'), 'w') as f:
+            f.write('"AppState"\n{\n\t"appid"\t\t"1"\n\t"StateFlags"\t\t"4"\n\t"installdir"\t\t"Linked"\n'
+                    '\t"SizeOnDisk"\t\t"100000"\n}\n')
+
+    def verdicts(self, use_cache):
+        class CacheMuncher(Muncher):
+            SCAN_CACHE_FILE = os.path.join(self.root, 'steam_scan.db')
+            def get_disks(self):
+                return []
+        muncher = CacheMuncher(use_cache=use_cache, library_roots=[self.library], out=open(os.devnull, 'w'))
+        self.addCleanup(muncher.out.close)
+        return [finding.verdict for finding in muncher.scan()]
+
+    def test_emptied_subdirectory_is_a_ghost_with_the_cache(self):
+        self.assertEqual(self.verdicts(use_cache=True), [])
+        os.remove(self.data) #leaves the install directory's own mtime alone
+        self.assertEqual(self.verdicts(use_cache=False), ['ghost'])
+        self.assertEqual(self.verdicts(use_cache=True), ['ghost'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from muncher_core import deleter
+from muncher_core.deleter import delete_paths
+
+class DeletePathsTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='muncher-delete-')
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_failure_that_is_not_a_read_only_path_is_reported(self):
+        error = PermissionError(13, 'Permission denied', self.root)
+        for exc in (error, (PermissionError, error, None)): #onexc and onerror
+            with self.assertRaises(PermissionError) as raised:
+                deleter._retry_writable(os.scandir, self.root, exc)
+            self.assertIs(raised.exception, error)
+
+    @unittest.skipIf(os.name == 'nt' or not hasattr(os, 'geteuid') or os.geteuid() == 0,
+                     "needs POSIX permissions that apply to the current user")
+    def test_unreadable_subdirectory_is_an_error_result(self):
+        game_dir = os.path.join(self.root, 'Ghost Game')
+        locked = os.path.join(game_dir, 'locked')
+        os.makedirs(locked)
+        with open(os.path.join(locked, 'save.dat'), 'w') as f:
+            f.write('save')
+        os.chmod(locked, 0)
+        self.addCleanup(os.chmod, locked, stat.S_IRWXU)
+        results = delete_paths([game_dir, os.path.join(self.root, 'appmanifest_30.acf')])
+        self.assertEqual(len(results), 1) #the manifest stays while its directory does
+        self.assertIsNotNone(results[0].error)
+        self.assertEqual(stat.S_IMODE(os.lstat(locked).st_mode), 0)
+
+    @unittest.skipIf(os.name == 'nt', "the read-only attribute does block deletion on Windows")
+    def test_mode_of_a_read_only_file_is_kept(self):
+        path = os.path.join(self.root, 'appmanifest_30.acf')
+        open(path, 'w').close()
+        os.chmod(path, stat.S_IRUSR | stat.S_IRGRP)
+        error = PermissionError(13, 'Permission denied', path)
+        with self.assertRaises(PermissionError):
+            deleter._retry_writable(os.unlink, path, error)
+        self.assertEqual(stat.S_IMODE(os.lstat(path).st_mode), stat.S_IRUSR | stat.S_IRGRP)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from muncher_core.quarantine import Quarantine
+
+class QuarantineReplayTest(unittest.TestCase):
+    '''Crashes are simulated by cutting the journal off right after a 'begin' record'''
+    BATCH = '20260101-000000-1'
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='muncher-quarantine-')
+        self.addCleanup(shutil.rmtree, self.root)
+        self.library = os.path.join(self.root, 'steamapps')
+        self.game_dir = os.path.join(self.library, 'common', 'Ghost Game')
+        self.manifest = os.path.join(self.library, 'appmanifest_30.acf')
+        os.makedirs(self.game_dir)
+        with open(os.path.join(self.game_dir, 'save.dat'), 'w') as f:
+            f.write('save')
+        with open(self.manifest, 'w') as f:
+            f.write('"AppState"\n{\n}\n')
+
+    def crash_after_begin(self, quarantine, path, torn=False):
+        '''Keeps the journal up to the 'begin' record for path, as if the process died right after it'''
+        with open(quarantine.journal_path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        relative = os.path.relpath(path, self.library)
+        cut = next(index for index, line in enumerate(lines)
+                   if json.loads(line)['state'] == 'begin' and json.loads(line)['src'] == relative)
+        with open(quarantine.journal_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines[:cut + 1])
+            if torn:
+                f.write('{"time": 1, "batch"')
+
+    def quarantined(self, destination):
+        return os.path.join(self.library, '.muncher_quarantine', self.BATCH, destination)
+
+    def test_move_that_happened_is_settled_as_done(self):
+        quarantine = Quarantine(self.library)
+        quarantine.quarantine(self.BATCH, [self.game_dir, self.manifest])
+        self.crash_after_begin(quarantine, self.manifest, torn=True)
+
+        replayed = Quarantine(self.library)
+        self.assertEqual(replayed.replay(), 1)
+        self.assertEqual(replayed.batches()[self.BATCH],
+                         {self.game_dir: self.quarantined(os.path.join('common', 'Ghost Game')),
+                          self.manifest: self.quarantined('appmanifest_30.acf')})
+        replayed.restore(self.BATCH)
+        self.assertTrue(os.path.isfile(os.path.join(self.game_dir, 'save.dat')))
+        self.assertTrue(os.path.isfile(self.manifest))
+        self.assertEqual(replayed.batches(), {})
+
+    def test_move_that_never_happened_is_settled_as_failed(self):
+        quarantine = Quarantine(self.library)
+        quarantine.quarantine(self.BATCH, [self.game_dir, self.manifest])
+        os.replace(self.quarantined('appmanifest_30.acf'), self.manifest) #the crash came before os.replace
+        self.crash_after_begin(quarantine, self.manifest)
+
+        replayed = Quarantine(self.library)
+        self.assertEqual(replayed.replay(), 1)
+        self.assertEqual(replayed.replay(), 0) #settled for good
+        self.assertEqual(list(replayed.batches()[self.BATCH]), [self.game_dir])
+        self.assertEqual(replayed.records()[-1]['state'], 'failed')
+
+    def test_journal_does_not_depend_on_the_working_directory(self):
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(self.root)
+        Quarantine('steamapps').quarantine(self.BATCH, [os.path.join('steamapps', 'appmanifest_30.acf')])
+        os.chdir(os.path.dirname(self.root))
+        results = Quarantine(self.library).restore(self.BATCH)
+        self.assertEqual([result.error for result in results], [None])
+        self.assertTrue(os.path.isfile(self.manifest))
+
+if __name__ == '__main__':
+    unittest.main()
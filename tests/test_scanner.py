@@ -0,0 +1,37 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from muncher_core import Muncher
+
+class ScanErrorTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='muncher-scan-')
+        self.addCleanup(shutil.rmtree, self.root)
+        self.library = os.path.join(self.root, 'steamapps')
+        os.makedirs(os.path.join(self.library, 'common'))
+        for appid in (10, 30):
+            with open(os.path.join(self.library, f'appmanifest_{appid}.acf'), 'w') as f:
+                f.write(f'"AppState"\n{{\n\t"appid"\t\t"{appid}"\n\t"installdir"\t\t"Gone {appid}"\n}}\n')
+
+    @unittest.skipUnless(hasattr(os, 'symlink') and os.name == 'posix', "needs symlinks")
+    def test_unreadable_manifest_does_not_end_the_scan(self):
+        os.symlink(os.path.join(self.root, 'missing'), os.path.join(self.library, 'appmanifest_20.acf'))
+        with open(os.devnull, 'w') as out:
+            muncher = Muncher(use_cache=False, library_roots=[self.library], out=out)
+            findings = [(os.path.basename(finding.manifest), finding.verdict) for finding in muncher.scan()]
+        self.assertEqual(findings, [('appmanifest_10.acf', 'unlinked'), ('appmanifest_20.acf', 'error'),
+                                    ('appmanifest_30.acf', 'unlinked')])
+
+    @unittest.skipUnless(hasattr(os, 'symlink') and os.name == 'posix', "needs symlinks")
+    def test_unreadable_manifest_skips_the_orphan_sweep(self):
+        os.makedirs(os.path.join(self.library, 'common', 'Unknown'))
+        os.symlink(os.path.join(self.root, 'missing'), os.path.join(self.library, 'appmanifest_20.acf'))
+        with open(os.devnull, 'w') as out:
+            muncher = Muncher(use_cache=False, library_roots=[self.library], out=out)
+            verdicts = [finding.verdict for finding in muncher.scan(orphans=True)]
+        self.assertNotIn('orphan', verdicts)
+
+if __name__ == '__main__':
+    unittest.main()